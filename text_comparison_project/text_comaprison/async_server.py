@@ -0,0 +1,218 @@
+'''
+:Script:       async_server.py
+
+:Purpose:      Serves the /api/compare API of index.py from an asyncio event
+               loop as an ASGI application. Scrubbing and scoring run on a
+               pool of processes started with the server, so one long
+               comparison never holds up the loop and every CPU is used.
+
+Script Process
+==============
+
+1) On startup, loads the contractions/synonyms table from the file named by
+   CONTRACTIONS_SYNONYMS_FILE, when it is set, and keeps watching it for
+   changes the same as index.py does. Then starts the worker processes and
+   has every one of them compile the table before the first request comes in
+2) Reads the body of each request on the loop and checks it with the same
+   read_pair as index.py, from comparison_api
+3) Turns the request away with 503 and a Retry-After header when max_pending
+   comparisons are already waiting for or running on the pool
+4) Sends the pair to the pool and waits for the score or for the client to
+   go away, whichever comes first. When the client goes away first, the
+   comparison is taken back out of the queue if it wasn't handed to a worker
+   yet
+5) Starts the workers again when the contractions/synonyms table is swapped,
+   for example when the file changes, letting the old ones finish the
+   comparisons they already have
+
+Only the standard library is used here; any ASGI server can run the app.
+
+Commands
+========
+
+$ uvicorn text_comaprison.async_server:app --host 0.0.0.0 --port 5000
+'''
+
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from text_comaprison import text_similarity_evaluator as evaluator
+from text_comaprison.comparison_api import comparison_result, read_pair
+from text_comaprison.dictionary_file import DictionaryFile
+
+MAX_PENDING_PER_WORKER = 4
+MAX_BODY_BYTES = 1 << 24
+RETRY_AFTER = 1
+
+def _init_worker(table):
+    evaluator.use_contractions_synonyms(
+        evaluator.ContractionsSynonymsMatcher(table))
+
+def _warm_up():
+    return os.getpid()
+
+class ComparisonApp:
+
+    def __init__(self, workers=None, max_pending=None,
+                 max_body_bytes=MAX_BODY_BYTES, dictionary_path=None):
+        self.workers = workers or os.cpu_count() or 1
+        if max_pending is None:
+            max_pending = self.workers * MAX_PENDING_PER_WORKER
+        self.max_pending = max_pending
+        self.max_body_bytes = max_body_bytes
+        self.dictionary_path = dictionary_path
+        self.dictionary_file = None
+        self.pending = 0
+        self.cancelled = 0
+        self._executor = None
+        self._matcher = None
+
+    def _pool(self):
+
+        # Starts the workers again when another contractions/synonyms table
+        # was swapped in since they started, without waiting for the old ones
+        matcher = evaluator.contractions_synonyms_matcher
+        if self._executor is None or matcher is not self._matcher:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker,
+                initargs=(matcher.table,))
+            self._matcher = matcher
+        return self._executor
+
+    async def start(self):
+
+        # The table is loaded in this process, where _pool sees it swapped,
+        # before the workers start with it
+        if self.dictionary_path and self.dictionary_file is None:
+            self.dictionary_file = DictionaryFile(self.dictionary_path).start()
+
+        # One task per worker makes the pool start all of them now
+        executor = self._pool()
+        await asyncio.gather(*(asyncio.wrap_future(executor.submit(_warm_up))
+                               for _ in range(self.workers)))
+
+    def close(self):
+        if self.dictionary_file is not None:
+            self.dictionary_file.stop()
+            self.dictionary_file = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, receive, send):
+        if scope["path"] != "/api/compare":
+            await _send_json(send, 404, {"error": "Not found"})
+            return
+        if scope["method"] != "POST":
+            await _send_json(send, 405, {"error": "Method not allowed"},
+                             [(b"allow", b"POST")])
+            return
+
+        body = await _read_body(receive, self.max_body_bytes)
+        if body is None:
+            await _send_json(send, 413, {"error": "Request body too large"})
+            return
+        try:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            first_text, second_text, threshold = read_pair(data)
+        except ValueError as error:
+            await _send_json(send, 400, {"error": str(error)})
+            return
+
+        if self.pending >= self.max_pending:
+            error = "Too many comparisons, try again later"
+            await _send_json(send, 503, {"error": error},
+                             [(b"retry-after", str(RETRY_AFTER).encode())])
+            return
+
+        result = await self._compare(receive, first_text, second_text,
+                                     threshold)
+        if result is not None:
+            await _send_json(send, 200, result)
+
+    async def _compare(self, receive, first_text, second_text, threshold):
+
+        # Returns the result, or None when the client went away first. A
+        # comparison counts as pending until its worker is done with it, even
+        # when nobody waits for it any more.
+        loop = asyncio.get_event_loop()
+        future = self._pool().submit(comparison_result, first_text,
+                                     second_text, threshold)
+        self.pending += 1
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._finished))
+
+        result = asyncio.wrap_future(future)
+        disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+        await asyncio.wait({result, disconnect},
+                           return_when=asyncio.FIRST_COMPLETED)
+        if result.done():
+            disconnect.cancel()
+            return result.result()
+
+        # Only a comparison still in the queue can be taken back
+        result.cancel()
+        if future.cancel():
+            self.cancelled += 1
+        return None
+
+    def _finished(self):
+        self.pending -= 1
+
+async def _read_body(receive, max_body_bytes):
+
+    # Returns the whole body, or None when it's longer than max_body_bytes
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return b""
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > max_body_bytes:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def _send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]
+                           + list(headers)})
+    await send({"type": "http.response.body", "body": body})
+
+app = ComparisonApp(
+    dictionary_path=os.environ.get("CONTRACTIONS_SYNONYMS_FILE"))
@@ -0,0 +1,401 @@
+'''
+:Script:       benchmark.py
+
+:Purpose:      Times text_scrubber, the alignment and padding, comparison_assessor
+               and main on synthetic texts from tweet to book size, checks the
+               fixed regression pairs still give their known scores, and saves
+               the results as JSON so runs can be compared.
+
+Script Process
+==============
+
+1) Generates pairs of texts with a seeded random generator. Each size sets the
+   number of sentences and words per sentence; the contraction density sets
+   how many words are contractions or synonyms from the scrubber table and
+   the similarity sets how many words of the second text are kept from the
+   first
+2) Times each stage separately and main end to end, repeating every
+   measurement and keeping the best and median time
+3) Scores the regression pairs and flags any score that changed
+4) Checks the fast paths against the original code on the Fetch Rewards
+   pair, the "can't've"/"how'll've" contractions and seeded random pairs of
+   texts and of scrubbed texts: the single pass scrubber against applying
+   the table in order, on the built in table and on seeded random tables
+   like a CONTRACTIONS_SYNONYMS_FILE can hold, the compatible engine against
+   comparison_assessor on every pair, errors included, and the default engine
+   against it wherever the original doesn't fail or move on early on a
+   repeated last word
+5) Writes the results as JSON and, when given an earlier results file, prints
+   how much each timing changed
+
+Commands
+========
+
+$ python -m text_comaprison.benchmark --output results.json
+
+$ python -m text_comaprison.benchmark --sizes tweet receipt --compare old.json
+
+$ python -m text_comaprison.benchmark --sizes tweet --equivalence-pairs 100000
+'''
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from text_comaprison.text_similarity_evaluator import ASSESSOR_BACKENDS, \
+    ContractionsSynonymsMatcher, _repeats_last_word, _replace_in_order, \
+    alignment_assessor, assessor_backend, comparison_assessor, \
+    compatible_assessor, \
+    contractions_synonyms_dict, contractions_synonyms_matcher, \
+    copy_text_list, main, text_aligner, text_scrubber
+
+# Sentences per text and words per sentence
+SIZES = {
+    "tweet": (2, 12),
+    "receipt": (4, 18),
+    "offer": (12, 20),
+    "article": (60, 20),
+    "contract": (600, 22),
+    "book": (5000, 18)
+    }
+
+FETCH_REWARDS_FIRST = "The easiest way to earn points with Fetch Rewards is to just shop for the products you already love. If you have any participating brands on your receipt, you'll get points based on the cost of the products. You don't need to clip any coupons or scan individual barcodes. Just scan each grocery receipt after you shop and we'll find the savings for you."
+FETCH_REWARDS_SECOND = "The easiest way to earn points with Fetch Rewards is to just shop for the items you already buy. If you have any eligible brands on your receipt, you will get points based on the total cost of the products. You do not need to cut out any coupons or scan individual UPCs. Just scan your receipt after you check out and we will find the savings for you."
+
+CONTRACTIONS_FIRST = "I can't've gone. She's how'll've it."
+CONTRACTIONS_SECOND = "I cannot've gone. She is how will have it."
+
+# Pairs with the score main is known to give them
+REGRESSION_CASES = [
+    ("fetch_rewards", FETCH_REWARDS_FIRST, FETCH_REWARDS_SECOND, 0.94),
+    ("fetch_rewards_same", FETCH_REWARDS_FIRST, FETCH_REWARDS_FIRST, 1.0),
+    ("contractions", CONTRACTIONS_FIRST, CONTRACTIONS_SECOND, 1.0),
+    ("different_lengths", "One two three four. Five six.",
+     "One two three four five. Six seven eight. Nine.", 0.0)
+    ]
+
+WORDS = ("receipt points brands shop coupons scan savings offer items price "
+         "store grocery cost total earn reward week bonus purchase brand "
+         "order deal product customer card app").split()
+CONTRACTIONS = [key for key in contractions_synonyms_dict
+                if not key.startswith(" ")]
+
+# Words of the random synonym tables, many of them inside one another
+TABLE_WORDS = ("check out outlet let shop store hour hours our please "
+               "buy now can't can not a an the in inn").split()
+
+def synthetic_text(generator, sentences, words, contraction_density):
+    text = []
+    for _ in range(sentences):
+        sentence = [generator.choice(CONTRACTIONS)
+                    if generator.random() < contraction_density
+                    else generator.choice(WORDS) for _ in range(words)]
+        text.append(" ".join(sentence))
+    return ". ".join(text) + "."
+
+def similar_text(generator, text, similarity):
+
+    # Keeps each word with the given probability and replaces the rest
+    return " ".join(word if generator.random() < similarity
+                    else generator.choice(WORDS) for word in text.split(" "))
+
+def synthetic_pair(size, contraction_density, similarity, seed):
+    generator = random.Random(seed)
+    sentences, words = SIZES[size]
+    first_text = synthetic_text(generator, sentences, words,
+                                contraction_density)
+    return first_text, similar_text(generator, first_text, similarity)
+
+def equivalence_pairs(count, seed):
+
+    # The fixed pairs, then random texts with contractions and synonyms whose
+    # second text drops some words
+    generator = random.Random(seed)
+    yield FETCH_REWARDS_FIRST, FETCH_REWARDS_SECOND
+    yield CONTRACTIONS_FIRST, CONTRACTIONS_SECOND
+    for _ in range(count):
+        first_text = synthetic_text(generator, generator.randint(1, 4),
+                                    generator.randint(1, 8), 0.3)
+        second_text = similar_text(generator, first_text, generator.random())
+        yield first_text, " ".join(word for word in second_text.split(" ")
+                                   if generator.random() < 0.9)
+
+def table_phrase(generator, words):
+    phrase = " ".join(generator.choice(TABLE_WORDS) for _ in range(words))
+    chance = generator.random()
+    if chance < 0.1:
+        return " " + phrase + " "
+    if chance < 0.2:
+        return phrase + generator.choice(".,'")
+    return phrase
+
+def equivalence_tables(count, seed):
+
+    # Tables like the ones a CONTRACTIONS_SYNONYMS_FILE can hold, whose keys
+    # overlap, run into other words and turn into one another, each with a
+    # text made of the same words
+    generator = random.Random(seed)
+    yield ({"check": "verify", "check out": "shop", "outlet": "store"},
+           "please check outlet hours")
+    for _ in range(count):
+        table = {}
+        for _ in range(generator.randint(1, 8)):
+            table[table_phrase(generator, generator.randint(1, 3))] = \
+                table_phrase(generator, generator.randint(0, 2))
+        yield table, table_phrase(generator, generator.randint(1, 12))
+
+def edited_sentence(generator, sentence, words):
+
+    # Drops, changes and adds words at random, keeping at least one
+    edited = []
+    for word in sentence:
+        chance = generator.random()
+        if chance < 0.1:
+            continue
+        edited.append(word if chance < 0.85 else generator.choice(words))
+        if generator.random() < 0.1:
+            edited.append(generator.choice(words))
+    return edited or [generator.choice(words)]
+
+def equivalence_text_lists(count, seed):
+
+    # Scrubbed texts of a few words, the second an edited copy of the first,
+    # so the original loop often moves on early or fails
+    generator = random.Random(seed)
+    for _ in range(count):
+        words = WORDS[:generator.randint(2, 12)]
+        first_text_list = [[generator.choice(words)
+                            for _ in range(generator.randint(1, 8))]
+                           for _ in range(generator.randint(1, 3))]
+        yield first_text_list, [edited_sentence(generator, sentence, words)
+                                for sentence in first_text_list]
+
+def reference_score(first_text_list, second_text_list, assessor):
+
+    # Scores copies of the lists, or returns None when the assessor fails the
+    # way the original loop does
+    try:
+        return assessor(copy_text_list(first_text_list),
+                        copy_text_list(second_text_list))
+    except IndexError:
+        return None
+
+def assessor_failures(first_text_list, second_text_list):
+
+    # Returns the engines that give another score than comparison_assessor
+    first_text_list, second_text_list = \
+        text_aligner(first_text_list, second_text_list)
+    reference = reference_score(first_text_list, second_text_list,
+                                comparison_assessor)
+    failures = []
+    if reference_score(first_text_list, second_text_list,
+                       compatible_assessor) != reference:
+        failures.append("compatible")
+    if reference is not None and \
+            not _repeats_last_word(first_text_list, second_text_list) and \
+            alignment_assessor(first_text_list, second_text_list) != reference:
+        failures.append("python")
+    return failures
+
+def equivalence_failures(count, seed):
+
+    # Returns (check, first text, second text) for every pair on which a fast
+    # path disagrees with the original code
+    failures = []
+    for first_text, second_text in equivalence_pairs(count, seed):
+        for text in (first_text, second_text):
+            if contractions_synonyms_matcher.replace(text) != \
+                    _replace_in_order(text, contractions_synonyms_dict):
+                failures.append(("scrubber", first_text, second_text))
+                break
+        for check in assessor_failures(text_scrubber(first_text),
+                                       text_scrubber(second_text)):
+            failures.append((check, first_text, second_text))
+
+    for first_text_list, second_text_list in equivalence_text_lists(count,
+                                                                     seed):
+        for check in assessor_failures(first_text_list, second_text_list):
+            failures.append((check, first_text_list, second_text_list))
+
+    for table, text in equivalence_tables(count, seed):
+        if ContractionsSynonymsMatcher(table).replace(text) != \
+                _replace_in_order(text, table):
+            failures.append(("table", table, text))
+    return failures
+
+def timed(function, repeat):
+
+    # Runs the function repeat times and returns the best and median seconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {"best": min(times), "median": statistics.median(times)}
+
+def stage_timings(first_text, second_text, repeat, backend):
+    assessor = assessor_backend(backend)
+    first_text_list = text_scrubber(first_text)
+    second_text_list = text_scrubber(second_text)
+    aligned = text_aligner(copy_text_list(first_text_list),
+                           copy_text_list(second_text_list))
+
+    # The assessor edits its input, so every run gets its own copies. The
+    # time spent copying is measured on its own under align.
+    copies = [(copy_text_list(aligned[0]), copy_text_list(aligned[1]))
+              for _ in range(repeat)]
+
+    return {
+        "scrub": timed(lambda: (text_scrubber(first_text),
+                                text_scrubber(second_text)), repeat),
+        "align": timed(lambda: text_aligner(copy_text_list(first_text_list),
+                                            copy_text_list(second_text_list)),
+                       repeat),
+        "assess": timed(lambda: assessor(*copies.pop()), repeat),
+        "main": timed(lambda: main(first_text, second_text, backend=backend),
+                      repeat)
+        }
+
+def repeats_for(size, repeat):
+
+    # Keeps the book sized runs short
+    sentences, words = SIZES[size]
+    return max(1, min(repeat, 200000 // (sentences * words)))
+
+def run_benchmarks(sizes, contraction_densities, similarities, repeat=20,
+                   backend="python", seed=0, equivalence_pairs_count=2000):
+    cases = []
+    for size in sizes:
+        for contraction_density in contraction_densities:
+            for similarity in similarities:
+                first_text, second_text = synthetic_pair(
+                    size, contraction_density, similarity, seed)
+                cases.append({
+                    "size": size,
+                    "sentences": SIZES[size][0],
+                    "words_per_sentence": SIZES[size][1],
+                    "contraction_density": contraction_density,
+                    "similarity": similarity,
+                    "characters": len(first_text) + len(second_text),
+                    "score": main(first_text, second_text, backend=backend),
+                    "timings": stage_timings(first_text, second_text,
+                                             repeats_for(size, repeat),
+                                             backend)
+                    })
+
+    regressions = []
+    for name, first_text, second_text, expected in REGRESSION_CASES:
+        score = main(first_text, second_text, backend=backend)
+        regressions.append({
+            "name": name,
+            "expected": expected,
+            "score": score,
+            "passed": score == expected,
+            "timings": {"main": timed(
+                lambda: main(first_text, second_text, backend=backend),
+                repeat)}
+            })
+
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "backend": backend,
+        "seed": seed,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cases": cases,
+        "regressions": regressions,
+        "equivalence": {
+            "pairs": equivalence_pairs_count * 2 + 2,
+            "tables": equivalence_pairs_count + 1,
+            "failures": equivalence_failures(equivalence_pairs_count, seed)
+            }
+        }
+
+def case_key(case):
+    if "name" in case:
+        return (case["name"],)
+    return (case["size"], case["contraction_density"], case["similarity"])
+
+def compare_results(previous, current):
+
+    # Returns (case, stage, previous best, current best) for every timing
+    # found in both runs
+    previous_cases = {case_key(case): case for case in
+                      previous["cases"] + previous["regressions"]}
+    changes = []
+    for case in current["cases"] + current["regressions"]:
+        old = previous_cases.get(case_key(case))
+        if old is None:
+            continue
+        for stage, timing in case["timings"].items():
+            if stage in old["timings"]:
+                changes.append((case_key(case), stage,
+                                old["timings"][stage]["best"],
+                                timing["best"]))
+    return changes
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Times the text similarity stages")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES),
+                        default=["tweet", "receipt", "offer", "article",
+                                 "contract"])
+    parser.add_argument("--contraction-densities", nargs="+", type=float,
+                        default=[0.0, 0.1])
+    parser.add_argument("--similarities", nargs="+", type=float,
+                        default=[0.5, 0.9, 1.0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--backend", choices=ASSESSOR_BACKENDS,
+                        default="python")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--equivalence-pairs", type=int, default=2000,
+                        help="random pairs checked against the original code")
+    parser.add_argument("--output", help="file to save the results to")
+    parser.add_argument("--compare", help="earlier results file")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.contraction_densities,
+                             args.similarities, args.repeat, args.backend,
+                             args.seed, args.equivalence_pairs)
+
+    for case in results["cases"]:
+        print("{:<9} contractions={:<4} similarity={:<4} score={:<5} {}".format(
+            case["size"], case["contraction_density"], case["similarity"],
+            case["score"], "  ".join(
+                "{}={:.3f}ms".format(stage, timing["best"] * 1000)
+                for stage, timing in case["timings"].items())))
+    for regression in results["regressions"]:
+        print("{:<20} expected={} score={} {}".format(
+            regression["name"], regression["expected"], regression["score"],
+            "ok" if regression["passed"] else "CHANGED"))
+    equivalence = results["equivalence"]
+    print("equivalence          pairs={} tables={} failures={}".format(
+        equivalence["pairs"], equivalence["tables"],
+        len(equivalence["failures"])))
+    for check, first_text, second_text in equivalence["failures"][:10]:
+        print("  {}: {!r} / {!r}".format(check, first_text, second_text))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as previous_file:
+            previous = json.load(previous_file)
+        for key, stage, before, after in compare_results(previous, results):
+            print("{:<40} {:<7} {:8.3f}ms -> {:8.3f}ms  {:+.1f}%".format(
+                " ".join(map(str, key)), stage, before * 1000, after * 1000,
+                (after - before) / before * 100 if before else 0.0))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if not all(regression["passed"] for regression in results["regressions"]):
+        return 1
+    if results["equivalence"]["failures"]:
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
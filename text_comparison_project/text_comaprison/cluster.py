@@ -0,0 +1,189 @@
+'''
+:Script:       cluster.py
+
+:Purpose:      Groups the near duplicate texts of a corpus: every pair of
+               texts scoring at or above the threshold ends up in the same
+               cluster. Cheap blocking keys pick the pairs worth scoring, so
+               most of the all-pairs comparisons are never made.
+
+Script Process
+==============
+
+1) Scrubs every text, or loads the scrubbed texts from a scrubbed_corpus
+   file
+2) Counts in how many texts each word appears and gives every text its
+   rarest words that appear in at least one other text as blocking keys.
+   Near duplicates share most of their words, so they share rare words too
+3) Pairs up the texts under each key in order of their sentence count and
+   only as long as the counts are close enough: the padding sentences of the
+   shorter text add nothing, so a pair can't score more than the ratio of
+   the sentence counts
+4) Skips pairs whose best score from the lengths of their sentences is below
+   the threshold, pairs already in the same cluster and pairs that share an
+   earlier key, then asks the early stopping verdict about the rest
+5) Joins the matching texts with union-find and writes the cluster of every
+   text, one line at a time
+
+The rare word keys can miss a near duplicate pair that shares none of the
+rare words of either text; more keys per text make that less likely.
+
+Commands
+========
+
+$ python -m text_comaprison.cluster texts.txt clusters.tsv --threshold 0.75
+
+The output holds one "text index<TAB>cluster" line per text; the cluster is
+the index of its first text.
+'''
+
+import argparse
+import sys
+from collections import Counter, defaultdict
+
+from text_comaprison import text_similarity_evaluator as evaluator
+from text_comaprison.corpus import read_texts
+from text_comaprison.scrubbed_corpus import load_or_build
+from text_comaprison.search import best_possible_score
+
+RARE_TOKENS = 4
+
+class UnionFind:
+
+    def __init__(self, count):
+        self.parent = list(range(count))
+        self.size = [1] * count
+
+    def __len__(self):
+        return len(self.parent)
+
+    def find(self, item):
+
+        # Points every other item on the way at its grandparent
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, first, second):
+        first = self.find(first)
+        second = self.find(second)
+        if first == second:
+            return False
+        if self.size[first] < self.size[second]:
+            first, second = second, first
+        self.parent[second] = first
+        self.size[first] += self.size[second]
+        return True
+
+    def assignments(self):
+
+        # Yields (item, cluster) in item order, the cluster being the first
+        # item of it
+        clusters = {}
+        for item in range(len(self.parent)):
+            yield item, clusters.setdefault(self.find(item), item)
+
+def blocking_keys(text_lists, rare_tokens=RARE_TOKENS):
+
+    # Returns the rarest words of each text that appear in another text too,
+    # rarest first
+    frequencies = Counter()
+    word_sets = []
+    for text_list in text_lists:
+        words = set()
+        for sentence in text_list:
+            words.update(sentence)
+        word_sets.append(words)
+        frequencies.update(words)
+
+    keys = []
+    for words in word_sets:
+        shared = [word for word in words if frequencies[word] > 1]
+        shared.sort(key=lambda word: (frequencies[word], word))
+        keys.append(shared[:rare_tokens])
+    return keys
+
+def cluster_texts(texts, threshold, rare_tokens=RARE_TOKENS,
+                  backend="python"):
+
+    # Returns the UnionFind of the texts and the counts of pairs skipped at
+    # each step. Texts can be raw strings or lists of scrubbed sentences.
+    text_lists = [evaluator.text_scrubber(text) if isinstance(text, str)
+                  else text for text in texts]
+    keys = blocking_keys(text_lists, rare_tokens)
+    key_sets = [set(text_keys) for text_keys in keys]
+    union_find = UnionFind(len(text_lists))
+    stats = Counter(all_pairs=len(text_lists) * (len(text_lists) - 1) // 2)
+
+    postings = defaultdict(list)
+    for index, text_keys in enumerate(keys):
+        for key in text_keys:
+            postings[key].append(index)
+
+    for key, indices in postings.items():
+        indices.sort(key=lambda index: len(text_lists[index]))
+        for position, first in enumerate(indices):
+            for second in indices[position + 1:]:
+
+                # Sentence counts only grow from here on
+                if round(len(text_lists[first])/len(text_lists[second]),
+                         2) < threshold:
+                    break
+                stats["blocked_pairs"] += 1
+
+                # Each pair is only looked at under the rarest key both share
+                if next(shared for shared in keys[first]
+                        if shared in key_sets[second]) != key:
+                    stats["repeated"] += 1
+                    continue
+                if union_find.find(first) == union_find.find(second):
+                    stats["same_cluster"] += 1
+                    continue
+                if best_possible_score(text_lists[first],
+                                       text_lists[second]) < threshold:
+                    stats["length_pruned"] += 1
+                    continue
+                stats["evaluated"] += 1
+                if evaluator.compare_scrubbed(text_lists[first],
+                                              text_lists[second], backend,
+                                              threshold):
+                    stats["matched"] += 1
+                    union_find.union(first, second)
+
+    stats["avoided"] = stats["all_pairs"] - stats["evaluated"]
+    return union_find, stats
+
+def write_clusters(output_file, union_find):
+    for item, cluster in union_find.assignments():
+        output_file.write("{}\t{}\n".format(item, cluster))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Groups the near duplicate texts of a corpus")
+    parser.add_argument("texts", help="file with one text per line")
+    parser.add_argument("output", help="file for the cluster of every text")
+    parser.add_argument("--threshold", type=float, default=0.75)
+    parser.add_argument("--rare-tokens", type=int, default=RARE_TOKENS,
+                        help="blocking keys per text")
+    parser.add_argument("--backend", choices=evaluator.ASSESSOR_BACKENDS,
+                        default="python")
+    parser.add_argument("--scrubbed", help="scrubbed corpus file to load "
+                        "the scrubbed texts from or save them to")
+    args = parser.parse_args(argv)
+
+    texts = read_texts(args.texts)
+    if args.scrubbed:
+        texts = load_or_build(args.scrubbed, texts).text_lists()
+    union_find, stats = cluster_texts(texts, args.threshold, args.rare_tokens,
+                                      args.backend)
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        write_clusters(output_file, union_find)
+
+    print("{all_pairs} pairs, {evaluated} scored, {avoided} avoided "
+          "({blocked_pairs} blocked together, {repeated} repeated, "
+          "{same_cluster} already clustered, {length_pruned} too different "
+          "in length), {matched} matched".format_map(stats), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+'''
+:Script:       comparison_api.py
+
+:Purpose:      Checks the JSON comparison requests of /api/compare and builds
+               their results, without any web framework, so index.py and
+               async_server.py answer them the same way and the worker
+               processes of async_server.py only load the evaluator.
+
+Script Process
+==============
+
+1) read_pair checks that a request is an object holding two non empty texts
+   and, optionally, a numeric threshold, raising ValueError with the message
+   to send back otherwise
+2) comparison_result scores the pair with main, or the scorer given, and
+   adds the threshold and whether the score reached it when one was given
+'''
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+def read_pair(data):
+
+    # Checks a JSON comparison request and returns its texts and threshold
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    first_text = data.get("first_text")
+    second_text = data.get("second_text")
+    if not isinstance(first_text, str) or not isinstance(second_text, str):
+        raise ValueError("first_text and second_text must be strings")
+    if not first_text or not second_text:
+        raise ValueError("Both texts are needed for a comparison")
+    threshold = data.get("threshold")
+    if threshold is not None and (isinstance(threshold, bool) or
+                                  not isinstance(threshold, (int, float))):
+        raise ValueError("threshold must be a number")
+    return first_text, second_text, threshold
+
+def comparison_result(first_text, second_text, threshold, scorer=None):
+    scorer = scorer or evaluator.main
+    result = {"score": scorer(first_text, second_text)}
+    if threshold is not None:
+        result["threshold"] = threshold
+        result["matched"] = result["score"] >= threshold
+    return result
@@ -0,0 +1,195 @@
+'''
+:Script:       corpus.py
+
+:Purpose:      Scores every pair of texts in a corpus on a pool of processes and
+               writes the scores as a compact matrix file or as a list of the
+               pairs scoring at or above a threshold.
+
+Script Process
+==============
+
+1) Scrubs every text once in the parent process
+2) Hands the scrubbed texts to each worker process once, when it starts
+3) Splits the upper triangle of the matrix into runs of rows holding about
+   the same number of pairs and scores each run in a worker
+4) Collects the scores as whole percentages, one byte per pair, as the runs
+   finish
+
+Scores are rounded to 2 decimals by comparison_assessor, so a percentage keeps
+them exactly.
+
+Matrix File
+===========
+
+The header is the 4 bytes b"TSIM", a version byte and the number of texts as
+a little endian unsigned 32 bit integer. It is followed by the full n by n
+matrix, one unsigned byte per cell holding the score times 100, row by row.
+
+Commands
+========
+
+$ python -m text_comaprison.corpus texts.txt matrix.tsim
+
+$ python -m text_comaprison.corpus texts.txt pairs.tsv --threshold 0.75
+
+$ python -m text_comaprison.corpus texts.txt m.tsim --scrubbed texts.scrub
+
+The input file holds one text per line. With --scrubbed, the scrubbed texts
+are loaded from the file when it is up to date and saved to it otherwise.
+'''
+
+import argparse
+import math
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from text_comaprison.scrubbed_corpus import load_or_build
+from text_comaprison.text_similarity_evaluator import ASSESSOR_BACKENDS, \
+    compare_scrubbed, text_scrubber
+
+MATRIX_MAGIC = b"TSIM"
+MATRIX_VERSION = 1
+MATRIX_HEADER = struct.Struct("<4sBI")
+PAIRS_PER_UNIT = 20000
+
+_worker_text_lists = None
+_worker_backend = None
+
+def _init_worker(text_lists, backend):
+    global _worker_text_lists, _worker_backend
+    _worker_text_lists = text_lists
+    _worker_backend = backend
+
+def _score_rows(start, end):
+
+    # Scores rows start to end - 1 against every later text in the corpus
+    text_lists = _worker_text_lists
+    rows = []
+    for i in range(start, end):
+        row = array("B", (int(round(compare_scrubbed(
+            text_lists[i], text_lists[j], _worker_backend) * 100))
+            for j in range(i + 1, len(text_lists))))
+        rows.append(row.tobytes())
+    return start, rows
+
+def row_units(text_count, pairs_per_unit=PAIRS_PER_UNIT):
+
+    # Groups rows so each work unit holds about pairs_per_unit pairs. Early
+    # rows have more pairs, so they get grouped into smaller runs.
+    start = 0
+    pairs = 0
+    for i in range(text_count - 1):
+        pairs += text_count - 1 - i
+        if pairs >= pairs_per_unit:
+            yield start, i + 1
+            start = i + 1
+            pairs = 0
+    if start < text_count - 1:
+        yield start, text_count - 1
+
+def pairwise_scores(texts, workers=None, pairs_per_unit=PAIRS_PER_UNIT,
+                    backend="python"):
+
+    # Yields (i, row) for every row of the upper triangle in the order the
+    # work units finish. row holds the percentages for texts i+1 to n-1.
+    # Texts can be raw strings or lists of sentences already scrubbed.
+    text_lists = [text_scrubber(text) if isinstance(text, str) else text
+                  for text in texts]
+    if len(text_lists) < 2:
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(text_lists, backend)) as executor:
+        futures = [executor.submit(_score_rows, start, end)
+                   for start, end in row_units(len(text_lists),
+                                               pairs_per_unit)]
+        for future in as_completed(futures):
+            start, rows = future.result()
+            for offset, row in enumerate(rows):
+                yield start + offset, row
+
+def similarity_matrix(texts, workers=None, pairs_per_unit=PAIRS_PER_UNIT,
+                      backend="python"):
+
+    # Returns the full matrix as a bytearray of percentages, row by row
+    texts = list(texts)
+    count = len(texts)
+    matrix = bytearray(count * count)
+    for i in range(count):
+        matrix[i * count + i] = 100
+
+    for i, row in pairwise_scores(texts, workers, pairs_per_unit, backend):
+        matrix[i * count + i + 1:(i + 1) * count] = row
+        for offset, percent in enumerate(row):
+            matrix[(i + 1 + offset) * count + i] = percent
+    return count, matrix
+
+def similar_pairs(texts, threshold, workers=None,
+                  pairs_per_unit=PAIRS_PER_UNIT, backend="python"):
+
+    # Yields (i, j, score) for every pair scoring at or above the threshold
+
+    # The smallest percentage at or above the threshold. Rounding would let
+    # 0.74 through for 0.745, the small margin keeps 0.55 * 100 at 55.
+    cutoff = math.ceil(threshold * 100 - 1e-9)
+    for i, row in pairwise_scores(texts, workers, pairs_per_unit, backend):
+        for offset, percent in enumerate(row):
+            if percent >= cutoff:
+                yield i, i + 1 + offset, percent / 100
+
+def write_matrix(path, count, matrix):
+    with open(path, "wb") as matrix_file:
+        matrix_file.write(MATRIX_HEADER.pack(MATRIX_MAGIC, MATRIX_VERSION,
+                                             count))
+        matrix_file.write(matrix)
+
+def read_matrix(path):
+    with open(path, "rb") as matrix_file:
+        magic, version, count = \
+            MATRIX_HEADER.unpack(matrix_file.read(MATRIX_HEADER.size))
+        if magic != MATRIX_MAGIC or version != MATRIX_VERSION:
+            raise ValueError("{} is not a similarity matrix file".format(path))
+        matrix = matrix_file.read(count * count)
+    return count, matrix
+
+def matrix_score(count, matrix, i, j):
+    return matrix[i * count + j] / 100
+
+def read_texts(path):
+    with open(path, encoding="utf-8") as texts_file:
+        return [line.rstrip("\n") for line in texts_file]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Scores every pair of texts in a corpus")
+    parser.add_argument("texts", help="file with one text per line")
+    parser.add_argument("output", help="matrix file, or pairs file when "
+                        "--threshold is given")
+    parser.add_argument("--threshold", type=float,
+                        help="only write pairs scoring at or above this")
+    parser.add_argument("--workers", type=int,
+                        help="number of processes, defaults to the CPU count")
+    parser.add_argument("--pairs-per-unit", type=int, default=PAIRS_PER_UNIT)
+    parser.add_argument("--backend", choices=ASSESSOR_BACKENDS,
+                        default="python")
+    parser.add_argument("--scrubbed", help="scrubbed corpus file to load "
+                        "the scrubbed texts from or save them to")
+    args = parser.parse_args(argv)
+
+    texts = read_texts(args.texts)
+    if args.scrubbed:
+        texts = load_or_build(args.scrubbed, texts).text_lists()
+    if args.threshold is None:
+        count, matrix = similarity_matrix(texts, args.workers,
+                                          args.pairs_per_unit, args.backend)
+        write_matrix(args.output, count, matrix)
+        return
+
+    with open(args.output, "w", encoding="utf-8") as pairs_file:
+        for i, j, score in similar_pairs(texts, args.threshold, args.workers,
+                                         args.pairs_per_unit, args.backend):
+            pairs_file.write("{}\t{}\t{:.2f}\n".format(i, j, score))
+
+if __name__ == '__main__':
+    main()
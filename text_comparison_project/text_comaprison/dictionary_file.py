@@ -0,0 +1,182 @@
+'''
+:Script:       dictionary_file.py
+
+:Purpose:      Loads the contractions/synonyms table from a JSON or TSV file
+               instead of the one written into text_similarity_evaluator, and
+               swaps in a new table whenever the file changes, without a
+               restart.
+
+Script Process
+==============
+
+1) Reads the file. A .json file holds one object mapping each contraction or
+   synonym to its replacement. Any other file is read as TSV with one
+   "key<TAB>value" pair per line; blank lines and lines starting with # are
+   skipped. Entries are applied in the order they appear in the file, the
+   same as contractions_synonyms_dict
+2) Compiles the table into a ContractionsSynonymsMatcher once and times it
+3) Installs the matcher with use_contractions_synonyms. Scrubs that already
+   started finish with the old matcher, the ones that start afterwards use
+   the new one
+4) A watcher thread checks the modification time and size of the file every
+   few seconds and repeats steps 1 to 3 when either changes. A file that
+   can't be read or parsed leaves the current table in place and is reported
+   in stats()
+
+Spaces at the start and end of TSV keys and values are kept, so rules like
+" the " can be written as they are.
+
+Commands
+========
+
+$ python -m text_comaprison.dictionary_file rules.json
+
+$ python -m text_comaprison.dictionary_file --export rules.tsv
+'''
+
+import argparse
+import json
+import os
+import threading
+import time
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+CHECK_INTERVAL = 2.0
+
+def load_table(path):
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as table_file:
+            table = json.load(table_file)
+        if not isinstance(table, dict) or not all(
+                isinstance(key, str) and isinstance(value, str)
+                for key, value in table.items()):
+            raise ValueError("{} must hold an object of strings".format(path))
+        return table
+
+    table = {}
+    with open(path, encoding="utf-8") as table_file:
+        for line_number, line in enumerate(table_file, 1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            if line.count("\t") != 1:
+                raise ValueError("{} line {}: expected key<TAB>value".format(
+                    path, line_number))
+            key, value = line.split("\t")
+            table[key] = value
+    return table
+
+def write_table(path, table):
+    with open(path, "w", encoding="utf-8") as table_file:
+        if path.endswith(".json"):
+            json.dump(table, table_file, indent=4)
+            return
+        for key, value in table.items():
+            table_file.write("{}\t{}\n".format(key, value))
+
+def compile_table(table):
+
+    # Returns the matcher and the seconds it took to compile
+    start = time.perf_counter()
+    matcher = evaluator.ContractionsSynonymsMatcher(table)
+    return matcher, time.perf_counter() - start
+
+class DictionaryFile:
+
+    def __init__(self, path, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.matcher = None
+        self.loads = 0
+        self.compile_seconds = None
+        self.last_error = None
+        self._file_state = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _current_file_state(self):
+        state = os.stat(self.path)
+        return state.st_mtime_ns, state.st_size
+
+    def reload(self, force=False):
+
+        # Loads and installs the table when the file changed since the last
+        # load. Returns True when a new table was installed. Only one thread
+        # compiles at a time; scrubs go on with the old table meanwhile.
+        with self._lock:
+            try:
+                file_state = self._current_file_state()
+                if file_state == self._file_state and not force:
+                    return False
+                matcher, seconds = compile_table(load_table(self.path))
+            except (OSError, ValueError) as error:
+                self.last_error = "{}: {}".format(type(error).__name__, error)
+                return False
+
+            evaluator.use_contractions_synonyms(matcher)
+            self.matcher = matcher
+            self.compile_seconds = seconds
+            self.loads += 1
+            self.last_error = None
+            self._file_state = file_state
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            self.reload()
+
+    def start(self):
+
+        # Loads the file now, failing if it can't be used, then keeps
+        # checking it for changes in a daemon thread
+        self.reload(force=True)
+        if self.matcher is None:
+            raise ValueError("Can't load {}: {}".format(self.path,
+                                                        self.last_error))
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch,
+                                            name="dictionary-file",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        stats = {
+            "path": self.path,
+            "loads": self.loads,
+            "compile_seconds": self.compile_seconds,
+            "last_error": self.last_error
+            }
+        if self.matcher is not None:
+            stats.update(self.matcher.stats())
+        return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compiles a contractions/synonyms file and reports the "
+        "compile time and table size")
+    parser.add_argument("path", help="JSON or TSV file")
+    parser.add_argument("--export", action="store_true",
+                        help="write the built in table to the file instead")
+    args = parser.parse_args(argv)
+
+    if args.export:
+        write_table(args.path, evaluator.contractions_synonyms_dict)
+        return
+
+    matcher, seconds = compile_table(load_table(args.path))
+    print("compiled in {:.1f}ms".format(seconds * 1000))
+    for name, value in matcher.stats().items():
+        print("{:<20} {}".format(name, value))
+
+if __name__ == '__main__':
+    main()
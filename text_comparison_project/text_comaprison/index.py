@@ -1,38 +1,294 @@
-from flask import Flask, request, render_template, redirect, url_for
-from text_comaprison.text_similarity_evaluator import main
+import hashlib
+import json
+import os
+import threading
+from time import perf_counter
+
+from flask import Flask, Response, request, render_template, jsonify, \
+  stream_with_context, g
+from markupsafe import escape
+from text_comaprison import metrics
+from text_comaprison.comparison_api import comparison_result, read_pair
+from text_comaprison.dictionary_file import DictionaryFile
+from text_comaprison.score_cache import ScoreCache
+from text_comaprison.text_similarity_evaluator import assess_scrubbed, \
+  copy_text_list, text_scrubber
 
 app = Flask(__name__)
 
-comparison = {}
+# Limits of a single bulk request, read from the config on every request
+app.config.setdefault("BULK_MAX_ITEMS", 10000)
+app.config.setdefault("BULK_MAX_LINE_BYTES", 1 << 20)
+
+# The number of bulk requests each process serves at once. The slots are made
+# on import, so the limit comes from the BULK_MAX_CONCURRENT environment
+# variable.
+bulk_slots = threading.BoundedSemaphore(
+    int(os.environ.get("BULK_MAX_CONCURRENT", 4)))
+
+# Served at /metrics. Set METRICS_DIR to add up the values of every process
+# of the server.
+REQUESTS = metrics.Counter(
+    "text_comparison_requests_total", "Requests answered",
+    ("route", "method", "status"))
+REQUEST_SECONDS = metrics.Histogram(
+    "text_comparison_request_duration_seconds",
+    "Time taken to answer a request", ("route",))
+SCRUB_SECONDS = metrics.Histogram(
+    "text_comparison_scrub_duration_seconds", "Time taken to scrub a text")
+ASSESS_SECONDS = metrics.Histogram(
+    "text_comparison_assess_duration_seconds",
+    "Time taken to align and score the scrubbed texts of a pair")
+INPUT_CHARACTERS = metrics.Histogram(
+    "text_comparison_input_characters", "Length of each text compared",
+    buckets=(100, 1000, 10000, 100000, 1000000, 10000000))
+INPUT_SENTENCES = metrics.Histogram(
+    "text_comparison_input_sentences", "Sentences in each text scored",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 1000, 10000, 100000))
+
+def measured_scrub(text):
+
+    # Scrubs a text the way main does, timing it and counting its sentences
+    start = perf_counter()
+    text_list = text_scrubber(text)
+    SCRUB_SECONDS.observe(perf_counter() - start)
+    INPUT_SENTENCES.observe(len(text_list))
+    return text_list
+
+def measured_assess(first_text_list, second_text_list):
+    start = perf_counter()
+    similarity_score = assess_scrubbed(first_text_list, second_text_list)
+    ASSESS_SECONDS.observe(perf_counter() - start)
+    return similarity_score
+
+def measured_main(first_text, second_text):
+
+    # main split into its two steps so each can be timed
+    if first_text == second_text:
+        return 1.0
+    return measured_assess(measured_scrub(first_text),
+                           measured_scrub(second_text))
+
+# Scores of the pairs compared recently. The cache is made on import, so its
+# size and the seconds a score is kept come from the SCORE_CACHE_SIZE and
+# SCORE_CACHE_TTL environment variables.
+score_cache = ScoreCache(int(os.environ.get("SCORE_CACHE_SIZE", 4096)),
+                         int(os.environ.get("SCORE_CACHE_TTL", 300)),
+                         measured_main)
+
+def pair_score(first_text, second_text):
+    INPUT_CHARACTERS.observe(len(first_text))
+    INPUT_CHARACTERS.observe(len(second_text))
+    return score_cache.score(first_text, second_text)
+
+# Reads the contractions/synonyms from a file, reloading it when it changes
+if os.environ.get("CONTRACTIONS_SYNONYMS_FILE"):
+  DictionaryFile(os.environ["CONTRACTIONS_SYNONYMS_FILE"]).start()
+
+NO_TEXT = '"No text given yet for comparison"'
+NO_SCORE = '"Not calculated yet"'
+
+@app.before_request
+def start_timer():
+    g.request_start = perf_counter()
+
+@app.after_request
+def count_request(response):
+
+    # Routes are counted by their rule, so the labels stay few. Streamed
+    # responses are timed until they start.
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUESTS.inc(route, request.method, response.status_code)
+    REQUEST_SECONDS.observe(perf_counter() - g.request_start, route)
+    return response
+
+@app.route('/metrics')
+def metrics_text():
+    return Response(metrics.REGISTRY.exposition(),
+                    content_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.route("/")
 def hello_world():
   return "Hello, World!"
 
-@app.route('/compare_text_info')
-def get_texts():
+def comparison_info(first_text, second_text, similarity_score):
     return '''
     <p>First text given: {}</p>
     <p>Second text given: {}</p>
     <p>The similarity score is: {}</p>'''\
-    .format(comparison["First text"], comparison["Second text"], \
-    comparison["Similarity score"])
+    .format(first_text, second_text, similarity_score)
+
+@app.route('/compare_text_info')
+def get_texts():
+
+    # Results are shown in the response to the form, nothing is kept between
+    # requests
+    return comparison_info(NO_TEXT, NO_TEXT, NO_SCORE)
+
+def cacheable(response, etag):
+
+    # Lets clients and proxies keep the result as long as the score cache does
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = score_cache.ttl
+    return response
+
+def pair_etag(first_text, second_text):
+
+    # The page shows the texts in the order they were given, so unlike the
+    # score cache key the ETag changes when they are swapped
+    texts = json.dumps([first_text, second_text]).encode("utf-8")
+    return hashlib.blake2b(ScoreCache.key(first_text, second_text) + texts,
+                           digest_size=16).hexdigest()
 
 @app.route('/compare_texts', methods=['GET', 'POST'])
 def compare_texts():
-    if request.method == 'POST':
-      comparison["First text"] = '"No text given yet for comparison"'
-      comparison["Second text"] = '"No text given yet for comparison"'
-      comparison["Similarity score"] = '"Not calculated yet"'
-      first_text = str(request.form['first_text'])
-      second_text = str(request.form['second_text'])
-      if first_text is "" and second_text is not "":
-          comparison["Second text"] = second_text
-      elif second_text is "" and first_text is not "":
-          comparison["First text"] = first_text
-      elif first_text and second_text:
-          comparison["Similarity score"] = main(first_text, second_text)
-          comparison["First text"] = first_text
-          comparison["Second text"] = second_text
-      return redirect(url_for('get_texts'))
-    return render_template("compare_texts.html")
+
+    # The texts can also be given in the query string, so the result of a
+    # GET can be cached and checked again with If-None-Match
+    if request.method == 'GET' and 'first_text' not in request.args:
+        return render_template("compare_texts.html")
+    texts = request.form if request.method == 'POST' else request.args
+    first_text = str(texts['first_text'])
+    second_text = str(texts['second_text'])
+    if not first_text or not second_text:
+        return comparison_info(escape(first_text) or NO_TEXT,
+                               escape(second_text) or NO_TEXT, NO_SCORE)
+
+    # The ETag is known without scoring the pair
+    etag = pair_etag(first_text, second_text)
+    if request.method == 'GET' and etag in request.if_none_match:
+        return cacheable(Response(status=304), etag)
+    similarity_score = pair_score(first_text, second_text)
+    return cacheable(Response(comparison_info(
+        escape(first_text), escape(second_text), similarity_score)), etag)
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    return jsonify(score_cache.stats())
+
+@app.route('/api/compare', methods=['POST'])
+def api_compare():
+
+    # Takes {"first_text": ..., "second_text": ..., "threshold": ...} and
+    # answers with the score in the same response
+    try:
+        first_text, second_text, threshold = \
+            read_pair(request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify(error=str(error)), 400
+    return jsonify(comparison_result(first_text, second_text, threshold,
+                                     pair_score))
+
+def ndjson_lines(stream, max_line_bytes):
+
+    # Yields (line number, line) as the request body comes in, skipping
+    # blank lines. Only one line is held at a time.
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_line_bytes:
+            raise ValueError("Line {} is longer than {} bytes".format(
+                line_number, max_line_bytes))
+        if line.strip():
+            yield line_number, line
+
+def scrubbed_query_scorer(query_list):
+
+    # Scores the query against a text for the score cache without scrubbing
+    # the query again. The query is copied since assessing edits the lists.
+    def scorer(query, text):
+        if query == text:
+            return 1.0
+        return measured_assess(copy_text_list(query_list),
+                               measured_scrub(text))
+    return scorer
+
+def bulk_results(lines, max_items):
+
+    # Scores each line as it is read. Lines are pairs like /api/compare
+    # takes, or a first line {"query": ..., "threshold": ...} followed by
+    # {"text": ...} lines scored against the query, which is scrubbed once.
+    # Blank lines are skipped, so the first line is the first one read.
+    query = None
+    query_threshold = None
+    query_scorer = None
+    items = 0
+    try:
+        for index, (line_number, line) in enumerate(lines):
+            try:
+                data = json.loads(line)
+                if index == 0 and isinstance(data, dict) and "query" in data:
+                    query, _, query_threshold = read_pair(
+                        {"first_text": data["query"], "second_text": ".",
+                         "threshold": data.get("threshold")})
+                    INPUT_CHARACTERS.observe(len(query))
+                    query_scorer = scrubbed_query_scorer(
+                        measured_scrub(query))
+                    continue
+
+                items += 1
+                if items > max_items:
+                    yield {"error": "More than {} items in one request"
+                           .format(max_items)}
+                    return
+
+                result = {"line": line_number}
+                if isinstance(data, dict) and "id" in data:
+                    result["id"] = data["id"]
+                if query_scorer is None:
+                    result.update(comparison_result(*read_pair(data),
+                                                    scorer=pair_score))
+                    yield result
+                    continue
+
+                text = data.get("text") if isinstance(data, dict) else None
+                if not isinstance(text, str) or not text:
+                    raise ValueError("Expected {\"text\": ...}")
+                INPUT_CHARACTERS.observe(len(text))
+                result["score"] = score_cache.score(query, text, query_scorer)
+                if query_threshold is not None:
+                    result["matched"] = result["score"] >= query_threshold
+                yield result
+            except ValueError as error:
+                yield {"line": line_number, "error": str(error)}
+    except ValueError as error:
+        yield {"error": str(error)}
+
+@app.route('/api/compare/bulk', methods=['POST'])
+def api_compare_bulk():
+
+    # Takes newline delimited JSON and streams one JSON result line back for
+    # every line. The body is read only as fast as the results are sent, and
+    # each process serves a few bulk requests at once, turning the others
+    # away so they can't hold up the single comparisons.
+    if not bulk_slots.acquire(blocking=False):
+        response = jsonify(error="Too many bulk requests, try again later")
+        response.status_code = 503
+        response.headers["Retry-After"] = "1"
+        return response
+
+    # The slot is given back when the results run out or when the server
+    # closes the response, whichever comes first
+    released = threading.Lock()
+
+    def release_slot():
+        if released.acquire(blocking=False):
+            bulk_slots.release()
+
+    def results():
+        try:
+            lines = ndjson_lines(request.stream,
+                                 app.config["BULK_MAX_LINE_BYTES"])
+            for result in bulk_results(lines, app.config["BULK_MAX_ITEMS"]):
+                yield json.dumps(result) + "\n"
+        finally:
+            release_slot()
+
+    response = Response(stream_with_context(results()),
+                        mimetype="application/x-ndjson")
+    response.call_on_close(release_slot)
+    return response
@@ -0,0 +1,111 @@
+'''
+:Script:       interning.py
+
+:Purpose:      Compact form of scrubbed texts for large stored corpora. Words
+               are interned to integer ids in a shared vocabulary and each text
+               is kept as one array('i') of ids plus the offsets where its
+               sentences start.
+
+Script Process
+==============
+
+1) Scrubs the text with text_scrubber, or takes sentences that were already
+   scrubbed
+2) Looks up the id of every word in the vocabulary, adding new words as they
+   are seen. The empty string always has id 0 so padding sentences can be
+   made without the vocabulary
+3) Stores all ids of the text in one array with the sentence offsets in a
+   second array
+4) interned_comparison_assessor scores two interned texts straight from the
+   arrays, so no word strings are rebuilt
+
+Ids are only comparable between texts interned with the same vocabulary.
+'''
+
+from array import array
+
+from text_comaprison.text_similarity_evaluator import sentence_assessor, \
+    text_scrubber
+
+EMPTY_WORD_ID = 0
+
+class Vocabulary:
+
+    def __init__(self):
+        self.ids = {"": EMPTY_WORD_ID}
+        self.words = [""]
+
+    def __len__(self):
+        return len(self.words)
+
+    def intern(self, word):
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.ids[word] = word_id
+            self.words.append(word)
+        return word_id
+
+    def intern_text_list(self, text_list):
+        tokens = array("i")
+        offsets = array("i", [0])
+        for sentence in text_list:
+            tokens.extend(map(self.intern, sentence))
+            offsets.append(len(tokens))
+        return InternedText(tokens, offsets)
+
+    def intern_text(self, text):
+        return self.intern_text_list(text_scrubber(text))
+
+    def text_list(self, interned_text):
+
+        # Turns an interned text back into the lists made by text_scrubber
+        return [[self.words[word_id] for word_id in sentence]
+                for sentence in interned_text.sentences()]
+
+class InternedText:
+
+    __slots__ = ("tokens", "offsets")
+
+    def __init__(self, tokens, offsets):
+        self.tokens = tokens
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def sentence(self, index):
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    def sentences(self):
+        for index in range(len(self)):
+            yield self.sentence(index)
+
+    def __eq__(self, other):
+        if not isinstance(other, InternedText):
+            return NotImplemented
+        return self.tokens == other.tokens and self.offsets == other.offsets
+
+    def __hash__(self):
+        return hash((self.tokens.tobytes(), self.offsets.tobytes()))
+
+PADDING_SENTENCE = array("i", [EMPTY_WORD_ID])
+
+def interned_comparison_assessor(first_text, second_text):
+
+    # Making sure the first text has the most sentences. The second text is
+    # padded with empty sentences, the same as text_aligner does.
+    if len(first_text) < len(second_text):
+        first_text, second_text = second_text, first_text
+
+    similarity_score = 0
+    for index in range(len(first_text)):
+        if index < len(second_text):
+            second_sentence = second_text.sentence(index)
+        else:
+            second_sentence = PADDING_SENTENCE
+        similarity_score += sentence_assessor(first_text.sentence(index),
+                                              second_sentence)
+
+    score = (round(similarity_score/len(first_text), 2))
+    return(score)
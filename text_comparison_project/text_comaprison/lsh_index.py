@@ -0,0 +1,142 @@
+'''
+:Script:       lsh_index.py
+
+:Purpose:      Finds the stored texts that are likely to score above the 0.75
+               sentence threshold against a new text without scoring every
+               stored text. Only the candidates it returns are scored with
+               comparison_assessor.
+
+Script Process
+==============
+
+1) Scrubs each text with text_scrubber and takes its set of words (or word
+   shingles)
+2) Builds a MinHash signature of that set: for every one of num_perm seeded
+   hash functions, the smallest hash over the set
+3) Splits the signature into bands of rows and files the text under each
+   band in a bucket. Texts whose sets overlap a lot share at least one band
+   with high probability
+4) A lookup collects the texts sharing a bucket with the new text and scores
+   just those
+
+Pairs scoring 0.75 or more share about 60% of their words or more. With the
+default 30 bands of 3 rows, a text whose word set has a Jaccard similarity of
+0.6 with the query is found 99.9% of the time (0.5: 98%), while texts sharing
+10% of their words turn up as a candidate 3% of the time. Texts can be added
+and removed at any time. Hashes are seeded, so signatures stay the same
+between processes.
+'''
+
+import hashlib
+import random
+from functools import lru_cache
+
+from text_comaprison.text_similarity_evaluator import compare_scrubbed, \
+    text_scrubber
+
+MERSENNE_PRIME = (1 << 61) - 1
+
+@lru_cache(maxsize=1 << 16)
+def _word_hash(shingle):
+    return int.from_bytes(hashlib.blake2b(
+        shingle.encode("utf-8", "surrogatepass"), digest_size=8).digest(),
+        "little")
+
+def text_shingles(text_list, shingle_size=1):
+
+    # Collects the words of the scrubbed text, or runs of shingle_size words
+    # within each sentence
+    shingles = set()
+    for sentence in text_list:
+        if len(sentence) < shingle_size:
+            shingles.add(" ".join(sentence))
+            continue
+        for start in range(len(sentence) - shingle_size + 1):
+            shingles.add(" ".join(sentence[start:start + shingle_size]))
+    return shingles
+
+class MinHashIndex:
+
+    def __init__(self, num_perm=90, bands=30, shingle_size=1, seed=1,
+                 backend="python"):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.backend = backend
+        generator = random.Random(seed)
+        self._permutations = [(generator.randrange(1, MERSENNE_PRIME),
+                               generator.randrange(0, MERSENNE_PRIME))
+                              for _ in range(num_perm)]
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+        self._text_lists = {}
+
+    def __len__(self):
+        return len(self._text_lists)
+
+    def __contains__(self, key):
+        return key in self._text_lists
+
+    def _text_list(self, text):
+        if isinstance(text, str):
+            return text_scrubber(text)
+        return text
+
+    def signature(self, text_list):
+        hashes = [_word_hash(shingle) for shingle in
+                  text_shingles(text_list, self.shingle_size)]
+        return tuple(min((a * word_hash + b) % MERSENNE_PRIME
+                         for word_hash in hashes)
+                     for a, b in self._permutations)
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key, text):
+
+        # Adds or replaces a text. Accepts raw text or scrubbed sentences,
+        # which are kept to score the text in lookups.
+        if key in self._text_lists:
+            self.remove(key)
+        text_list = self._text_list(text)
+        signature = self.signature(text_list)
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band].setdefault(band_key, set()).add(key)
+        self._signatures[key] = signature
+        self._text_lists[key] = text_list
+
+    def remove(self, key):
+        signature = self._signatures.pop(key)
+        del self._text_lists[key]
+        for band, band_key in self._band_keys(signature):
+            bucket = self._buckets[band][band_key]
+            bucket.discard(key)
+            if not bucket:
+                del self._buckets[band][band_key]
+
+    def candidates(self, text):
+
+        # Returns the keys of the stored texts sharing a band with the text
+        signature = self.signature(self._text_list(text))
+        found = set()
+        for band, band_key in self._band_keys(signature):
+            found.update(self._buckets[band].get(band_key, ()))
+        return found
+
+    def query(self, text, threshold=.75):
+
+        # Scores the candidates and returns (key, score) for the ones scoring
+        # at or above the threshold, best first
+        text_list = self._text_list(text)
+        results = []
+        for key in self.candidates(text_list):
+            score = compare_scrubbed(text_list, self._text_lists[key],
+                                     self.backend)
+            if score >= threshold:
+                results.append((key, score))
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results
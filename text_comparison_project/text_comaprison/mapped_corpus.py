@@ -0,0 +1,270 @@
+'''
+:Script:       mapped_corpus.py
+
+:Purpose:      Scans a query against a large corpus kept in one text file, one
+               text per line, without loading the corpus into Python strings.
+               The corpus and an offset index are memory mapped read only, so
+               processes scanning the same corpus share the page cache.
+
+Script Process
+==============
+
+1) Reads the corpus once and writes the index file: the byte offset where
+   every line starts and, when asked for, a token section holding every text
+   already scrubbed
+2) Maps the corpus and the index read only. A record is a slice of the
+   mapped corpus, so nothing is copied until a text is decoded
+3) Takes the scrubbed sentences of a record from the token section when the
+   index has one made with the current contractions/synonyms table, or else
+   scrubs the record when it is needed
+4) Scores the query against every record and yields the ones at or above the
+   threshold
+
+Index File
+==========
+
+The header is the 4 bytes b"TIDX", a version byte, a flags byte (1 when the
+token section is there), the number of records as a little endian unsigned
+64 bit integer and the 16 byte digest of the contractions/synonyms table the
+tokens were made with. It is followed by the count + 1 line offsets as little
+endian unsigned 64 bit integers. With tokens, count + 1 offsets into the
+token section come next, followed by the token section itself: for every
+record, its scrubbed sentences joined by newlines, the words of each joined
+by spaces, in UTF-8.
+
+Lines end with "\n"; a "\r" before it is dropped.
+
+Commands
+========
+
+$ python -m text_comaprison.mapped_corpus index texts.txt --tokens
+
+$ python -m text_comaprison.mapped_corpus scan texts.txt "text" --threshold .8
+'''
+
+import argparse
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+INDEX_MAGIC = b"TIDX"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sBBQ16s")
+HAS_TOKENS = 1
+OFFSET_SIZE = 8
+
+def index_path_for(corpus_path):
+    return corpus_path + ".idx"
+
+def _little_endian(offsets):
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    return offsets
+
+def _offsets_view(view):
+
+    # Reads the offsets in place on little endian machines and copies them
+    # everywhere else
+    if sys.byteorder == "little":
+        return view.cast("Q")
+    offsets = array("Q")
+    offsets.frombytes(view)
+    offsets.byteswap()
+    return offsets
+
+def _tokens(text_list):
+    sentences = [" ".join(sentence) for sentence in text_list]
+    if any("\n" in sentence for sentence in sentences):
+        raise ValueError("Scrubbed words can't hold newlines")
+    return "\n".join(sentences).encode("utf-8", "surrogatepass")
+
+def build_index(corpus_path, index_path=None, tokens=False):
+    if index_path is None:
+        index_path = index_path_for(corpus_path)
+    matcher = evaluator.contractions_synonyms_matcher
+    line_offsets = array("Q", [0])
+    token_offsets = array("Q", [0])
+
+    with open(corpus_path, "rb") as corpus_file, \
+            tempfile.TemporaryFile() as token_file:
+        position = 0
+        token_position = 0
+        for line in corpus_file:
+
+            # A last line without "\n" is a record as well
+            position += len(line)
+            line_offsets.append(position)
+            if tokens:
+                text = _record_text(line)
+                token_bytes = _tokens(evaluator.text_scrubber(text, matcher))
+                token_file.write(token_bytes)
+                token_position += len(token_bytes)
+                token_offsets.append(token_position)
+
+        count = len(line_offsets) - 1
+        with open(index_path, "wb") as index_file:
+            index_file.write(INDEX_HEADER.pack(
+                INDEX_MAGIC, INDEX_VERSION, HAS_TOKENS if tokens else 0,
+                count, matcher.digest if tokens else bytes(16)))
+            index_file.write(_little_endian(line_offsets).tobytes())
+            if tokens:
+                index_file.write(_little_endian(token_offsets).tobytes())
+                token_file.seek(0)
+                shutil.copyfileobj(token_file, index_file)
+    return count
+
+def _record_text(record):
+
+    # Decodes a line straight from the bytes or memoryview holding it
+    if record[-1:] == b"\n":
+        record = record[:-1]
+    if record[-1:] == b"\r":
+        record = record[:-1]
+    return str(record, "utf-8", "surrogateescape")
+
+def _map(path):
+    with open(path, "rb") as mapped_file:
+        if os.fstat(mapped_file.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+class MappedCorpus:
+
+    def __init__(self, corpus_path, index_path=None):
+        if index_path is None:
+            index_path = index_path_for(corpus_path)
+        self._corpus = _map(corpus_path)
+        self._index = _map(index_path)
+        if self._index is None or len(self._index) < INDEX_HEADER.size:
+            raise ValueError("{} is not a corpus index file".format(
+                index_path))
+        magic, version, flags, count, digest = \
+            INDEX_HEADER.unpack_from(self._index)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError("{} is not a corpus index file".format(
+                index_path))
+
+        self.count = count
+        self.token_digest = digest if flags & HAS_TOKENS else None
+        view = memoryview(self._index)
+        start = INDEX_HEADER.size
+        end = start + (count + 1) * OFFSET_SIZE
+        self._line_offsets = _offsets_view(view[start:end])
+        self._token_offsets = None
+        if flags & HAS_TOKENS:
+            self._token_offsets = _offsets_view(
+                view[end:end + (count + 1) * OFFSET_SIZE])
+            self._token_start = end + (count + 1) * OFFSET_SIZE
+
+        corpus_size = len(self._corpus) if self._corpus is not None else 0
+        if self._line_offsets[count] != corpus_size:
+            raise ValueError("{} doesn't match {}".format(index_path,
+                                                          corpus_path))
+
+    def __len__(self):
+        return self.count
+
+    def has_tokens(self):
+
+        # Tokens made with another contractions/synonyms table are ignored
+        return self.token_digest is not None and \
+            self.token_digest == evaluator.contractions_synonyms_matcher.digest
+
+    def record(self, index):
+
+        # Returns the raw line as a memoryview of the mapped corpus, which
+        # has to be released before the corpus is closed
+        if not 0 <= index < self.count:
+            raise IndexError("record index out of range")
+        return memoryview(self._corpus)[self._line_offsets[index]:
+                                        self._line_offsets[index + 1]]
+
+    def text(self, index):
+        return _record_text(self.record(index))
+
+    def text_list(self, index):
+        if not self.has_tokens():
+            return evaluator.text_scrubber(self.text(index))
+        start = self._token_start + self._token_offsets[index]
+        end = self._token_start + self._token_offsets[index + 1]
+        tokens = self._index[start:end].decode("utf-8", "surrogatepass")
+        return [sentence.split(" ") for sentence in tokens.split("\n")]
+
+    def scan(self, query, threshold=None, backend="python"):
+
+        # Yields (index, score) for every record, or only for the records
+        # scoring at or above the threshold. Below the threshold the records
+        # are only judged, without working out their score.
+        query_list = evaluator.text_scrubber(query)
+        for index in range(self.count):
+            text_list = self.text_list(index)
+            if threshold is not None and not evaluator.compare_scrubbed(
+                    query_list, text_list, backend, threshold):
+                continue
+            yield index, evaluator.compare_scrubbed(query_list, text_list,
+                                                    backend)
+
+    def close(self):
+
+        # Unmaps the index even when the corpus can't be unmapped because a
+        # memoryview from record() is still held. Calling close again once it
+        # is released unmaps the corpus.
+        self._line_offsets = self._token_offsets = None
+        try:
+            if self._corpus is not None:
+                self._corpus.close()
+                self._corpus = None
+        except BufferError:
+            raise BufferError("Release the memoryviews from record() before "
+                              "closing the corpus")
+        finally:
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Indexes a corpus file or scans a query against it")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    index_parser = commands.add_parser("index", help="write the index file")
+    index_parser.add_argument("corpus", help="file with one text per line")
+    index_parser.add_argument("--index", help="defaults to <corpus>.idx")
+    index_parser.add_argument("--tokens", action="store_true",
+                              help="store every text already scrubbed")
+
+    scan_parser = commands.add_parser("scan", help="score a query against "
+                                      "every text")
+    scan_parser.add_argument("corpus", help="file with one text per line")
+    scan_parser.add_argument("query")
+    scan_parser.add_argument("--index", help="defaults to <corpus>.idx")
+    scan_parser.add_argument("--threshold", type=float, default=0.75)
+    scan_parser.add_argument("--backend", choices=evaluator.ASSESSOR_BACKENDS,
+                             default="python")
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        count = build_index(args.corpus, args.index, args.tokens)
+        print("indexed {} texts".format(count))
+        return
+
+    with MappedCorpus(args.corpus, args.index) as corpus:
+        for index, score in corpus.scan(args.query, args.threshold,
+                                        args.backend):
+            print("{}\t{:.2f}".format(index, score))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+'''
+:Script:       metrics.py
+
+:Purpose:      Counters and histograms for the web app, written out in the
+               Prometheus text format. Counting a request costs a few dict
+               lookups and additions, and the values of every process of the
+               server are added up when they are written out.
+
+Script Process
+==============
+
+1) Every counter, histogram bucket, sum and count is one double, found by a
+   key made from the metric name, the kind of value and the labels. The keys
+   of a set of label values are worked out the first time it is used
+2) Without the METRICS_DIR environment variable, the doubles are kept in a
+   dict of the process. With it, each process keeps them in a memory mapped
+   file of its own in that directory, so no process ever writes to the file
+   of another and no lock is shared between processes. A process forked from
+   another starts a file of its own. The file is named after the pid and a
+   random part, so a new process never reuses the file of one that exited
+3) A histogram adds 1 to the bucket the value falls in, adds the value to the
+   sum and 1 to the count. The buckets are made cumulative only when they are
+   written out
+4) exposition() reads the values of every process, adds them up and writes
+   them out grouped by metric, with the HELP and TYPE lines
+
+The files of processes that exited are still read, so the counts don't drop
+when a worker is restarted. Empty METRICS_DIR before the server starts.
+
+Values File
+===========
+
+The first 8 bytes hold the number of bytes in use as a little endian unsigned
+64 bit integer. Entries follow, each made of the length of the key as a little
+endian unsigned 32 bit integer, the key in UTF-8 padded with zero bytes to a
+multiple of 8 bytes counting the length, and the value as a little endian
+double. An entry is written whole before the number of bytes in use is
+updated, so readers never see half an entry.
+'''
+
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+
+METRICS_DIR = "METRICS_DIR"
+INITIAL_FILE_SIZE = 1 << 16
+LATENCY_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_USED = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+def _padded(length):
+    return (length + 7) & ~7
+
+class LocalValues:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._values = {}
+
+    def add(self, key, amount):
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def items(self):
+        with self.lock:
+            return list(self._values.items())
+
+class MappedValues:
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._positions = {}
+        self._file = open(path, "w+b")
+        self._file.truncate(INITIAL_FILE_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), INITIAL_FILE_SIZE)
+        self._used = _USED.size
+        _USED.pack_into(self._map, 0, self._used)
+
+    def add(self, key, amount):
+        position = self._positions.get(key)
+        if position is None:
+            position = self._new_entry(key)
+        value, = _VALUE.unpack_from(self._map, position)
+        _VALUE.pack_into(self._map, position, value + amount)
+
+    def _new_entry(self, key):
+        encoded = key.encode("utf-8")
+        size = _padded(_KEY_LENGTH.size + len(encoded)) + _VALUE.size
+        if self._used + size > len(self._map):
+            new_size = len(self._map) * 2
+            while self._used + size > new_size:
+                new_size *= 2
+            self._map.close()
+            self._file.truncate(new_size)
+            self._map = mmap.mmap(self._file.fileno(), new_size)
+
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:
+                  self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        position = self._used + size - _VALUE.size
+        _VALUE.pack_into(self._map, position, 0.0)
+        self._used += size
+        _USED.pack_into(self._map, 0, self._used)
+        self._positions[key] = position
+        return position
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+def read_values_file(data):
+
+    # Yields (key, value) for every entry of a values file
+    used, = _USED.unpack_from(data, 0)
+    position = _USED.size
+    while position < used:
+        length, = _KEY_LENGTH.unpack_from(data, position)
+        key = bytes(data[position + _KEY_LENGTH.size:
+                         position + _KEY_LENGTH.size + length])
+        position += _padded(_KEY_LENGTH.size + length)
+        value, = _VALUE.unpack_from(data, position)
+        position += _VALUE.size
+        yield key.decode("utf-8"), value
+
+def _process_values():
+    directory = os.environ.get(METRICS_DIR)
+    if not directory:
+        return LocalValues()
+
+    # The random part keeps a process that gets the pid of one that exited
+    # from writing over its file
+    name = "values_{}_{}.db".format(os.getpid(), os.urandom(8).hex())
+    return MappedValues(os.path.join(directory, name))
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+        self.values = _process_values()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forked)
+
+    def _forked(self):
+
+        # The child writes to a file of its own, the counts it inherited
+        # stay in the file of the parent
+        if isinstance(self.values, MappedValues):
+            self.values = _process_values()
+            for metric in self.metrics:
+                metric.forget_keys()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self):
+
+        # Returns the values of every process added up
+        directory = os.environ.get(METRICS_DIR)
+        totals = {}
+        if isinstance(self.values, MappedValues):
+            for name in os.listdir(directory):
+                if not name.startswith("values_") or \
+                        not name.endswith(".db"):
+                    continue
+                with open(os.path.join(directory, name), "rb") as values_file:
+                    data = values_file.read()
+                if len(data) < _USED.size:
+                    continue
+                for key, value in read_values_file(data):
+                    totals[key] = totals.get(key, 0.0) + value
+        else:
+            for key, value in self.values.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def exposition(self):
+        totals = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            lines.extend(metric.samples(totals))
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n") \
+        .replace('"', '\\"')
+
+def _label_text(label_names, label_values):
+    return ",".join('{}="{}"'.format(name, _escape(value))
+                    for name, value in zip(label_names, label_values))
+
+def _number(value):
+    if value != value:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value) and abs(value) < 1 << 53:
+        return str(int(value))
+    return repr(value)
+
+def _sample(name, label_text, value):
+    if label_text:
+        return "{}{{{}}} {}".format(name, label_text, _number(value))
+    return "{} {}".format(name, _number(value))
+
+def _labels_by_key(totals, name):
+
+    # Returns the label texts seen under a metric, sorted
+    prefix = name + "\x00"
+    label_texts = {}
+    for key in totals:
+        if key.startswith(prefix):
+            label_texts.setdefault(key.rsplit("\x00", 1)[1])
+    return sorted(label_texts)
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name, help, label_names=(), registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.registry = registry
+        self._keys = {}
+        registry.register(self)
+
+    def forget_keys(self):
+        self._keys = {}
+
+    def inc(self, *label_values, amount=1):
+        key = self._keys.get(label_values)
+        if key is None:
+            key = self._keys[label_values] = "{}\x00total\x00{}".format(
+                self.name, _label_text(self.label_names, label_values))
+        values = self.registry.values
+        with values.lock:
+            values.add(key, amount)
+
+    def samples(self, totals):
+        for label_text in _labels_by_key(totals, self.name):
+            yield _sample(self.name, label_text, totals[
+                "{}\x00total\x00{}".format(self.name, label_text)])
+
+class Histogram:
+
+    kind = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=LATENCY_BUCKETS,
+                 registry=REGISTRY):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self.registry = registry
+        self._keys = {}
+        registry.register(self)
+
+    def forget_keys(self):
+        self._keys = {}
+
+    def _label_keys(self, label_values):
+
+        # One key per bucket, the last one for values above every bucket,
+        # then the keys of the sum and of the count
+        label_text = _label_text(self.label_names, label_values)
+        keys = ["{}\x00bucket{}\x00{}".format(self.name, index, label_text)
+                for index in range(len(self.buckets) + 1)]
+        keys.append("{}\x00sum\x00{}".format(self.name, label_text))
+        keys.append("{}\x00count\x00{}".format(self.name, label_text))
+        self._keys[label_values] = keys
+        return keys
+
+    def observe(self, value, *label_values):
+        keys = self._keys.get(label_values)
+        if keys is None:
+            keys = self._label_keys(label_values)
+        values = self.registry.values
+        with values.lock:
+            values.add(keys[bisect_left(self.buckets, value)], 1)
+            values.add(keys[-2], value)
+            values.add(keys[-1], 1)
+
+    def samples(self, totals):
+        for label_text in _labels_by_key(totals, self.name):
+            separator = "," if label_text else ""
+            cumulative = 0.0
+            for index, bound in enumerate(self.buckets +
+                                          (float("inf"),)):
+                cumulative += totals.get("{}\x00bucket{}\x00{}".format(
+                    self.name, index, label_text), 0.0)
+                yield _sample(self.name + "_bucket", '{}{}le="{}"'.format(
+                    label_text, separator, _number(bound)), cumulative)
+            for suffix in ("sum", "count"):
+                yield _sample("{}_{}".format(self.name, suffix), label_text,
+                              totals.get("{}\x00{}\x00{}".format(
+                                  self.name, suffix, label_text), 0.0))
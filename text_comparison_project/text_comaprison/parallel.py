@@ -0,0 +1,146 @@
+'''
+:Script:       parallel.py
+
+:Purpose:      Scores one pair of very long texts on a pool of processes. Once
+               the texts are padded, every sentence pair is scored on its
+               own, so runs of sentence pairs are scrubbed and scored in
+               separate processes. Texts below a set size are scored with main
+               in the calling process. Gives the same score as main.
+
+Script Process
+==============
+
+1) Splits both texts on ". " in the calling process, which is cheap, and
+   scrubs only the last two pieces of each there, because text_scrubber
+   strips trailing spaces from the whole text before it is split
+2) Sends runs of chunk_sentences raw sentence pairs to the workers. Each
+   worker compiled the contractions/synonyms table once when it started,
+   scrubs the sentences of its run the way streaming_text_scrubber does and
+   scores them with sentence_assessor
+3) Workers send back the score of every sentence as an array of doubles, and
+   the scores are added up in sentence order, the same way
+   alignment_assessor adds them, so the rounded score is exactly the same
+
+Raw text is much quicker to send to a process than lists of words, and
+scrubbing is most of the work, so it is done in the workers as well. Only the
+linear engine is used.
+'''
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from text_comaprison import text_similarity_evaluator as evaluator
+from text_comaprison.streaming import end_sentences
+
+MIN_CHARACTERS = 1 << 20
+CHUNK_SENTENCES = 2000
+
+_worker_matcher = None
+
+def _init_worker(table):
+    global _worker_matcher
+    _worker_matcher = evaluator.ContractionsSynonymsMatcher(table)
+
+def _worker_sentence(item, index):
+
+    # Raw pieces after the first are scrubbed with the space of the ". " in
+    # front of them. Lists are sentences scrubbed already and None pads the
+    # shorter text.
+    if item is None:
+        return [""]
+    if not isinstance(item, str):
+        return item
+    if index == 0:
+        return evaluator.sentence_splitter(_worker_matcher.replace(item))
+    return evaluator.sentence_splitter(
+        _worker_matcher.replace(" " + item)[1:])
+
+def _score_chunk(start, first_items, second_items):
+    scores = array("d")
+    for offset, (first_item, second_item) in enumerate(zip(first_items,
+                                                           second_items)):
+        scores.append(evaluator.sentence_assessor(
+            _worker_sentence(first_item, start + offset),
+            _worker_sentence(second_item, start + offset)))
+    return scores.tobytes()
+
+def _sentence_items(text, matcher):
+
+    # Returns the raw pieces of the text, with the sentences made from the
+    # last two pieces in place of them
+    pieces = text.split(". ")
+    tail_start = max(len(pieces) - 2, 0)
+    last_pieces = [matcher.replace(piece) if index == 0
+                   else matcher.replace(" " + piece)[1:]
+                   for index, piece in enumerate(pieces[tail_start:],
+                                                 tail_start)]
+    return pieces[:tail_start] + end_sentences(last_pieces)
+
+class ParallelScorer:
+
+    def __init__(self, workers=None, min_characters=MIN_CHARACTERS,
+                 chunk_sentences=CHUNK_SENTENCES):
+        self.workers = workers
+        self.min_characters = min_characters
+        self.chunk_sentences = chunk_sentences
+        self._executor = None
+        self._matcher = None
+
+    def _pool(self):
+
+        # Starts the workers again when another contractions/synonyms table
+        # was swapped in since they started
+        matcher = evaluator.contractions_synonyms_matcher
+        if self._executor is None or matcher is not self._matcher:
+            self.close()
+            self._executor = ProcessPoolExecutor(
+                self.workers, initializer=_init_worker,
+                initargs=(matcher.table,))
+            self._matcher = matcher
+        return self._executor, matcher
+
+    def compare(self, first_text, second_text):
+        if len(first_text) + len(second_text) < self.min_characters or \
+                first_text == second_text:
+            return evaluator.main(first_text, second_text)
+
+        executor, matcher = self._pool()
+        first_items = _sentence_items(first_text, matcher)
+        second_items = _sentence_items(second_text, matcher)
+        sentence_count = max(len(first_items), len(second_items))
+        first_items += [None] * (sentence_count - len(first_items))
+        second_items += [None] * (sentence_count - len(second_items))
+
+        futures = [executor.submit(
+            _score_chunk, start,
+            first_items[start:start + self.chunk_sentences],
+            second_items[start:start + self.chunk_sentences])
+            for start in range(0, sentence_count, self.chunk_sentences)]
+
+        similarity_score = 0
+        for future in futures:
+            for sentence_score in array("d", future.result()):
+                similarity_score += sentence_score
+
+        score = (round(similarity_score/sentence_count, 2))
+        return(score)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parallel_main(first_text, second_text, workers=None,
+                  min_characters=MIN_CHARACTERS,
+                  chunk_sentences=CHUNK_SENTENCES):
+
+    # Scores one pair with a pool that lasts for this call only. Use a
+    # ParallelScorer to keep the workers between calls.
+    with ParallelScorer(workers, min_characters, chunk_sentences) as scorer:
+        return scorer.compare(first_text, second_text)
@@ -0,0 +1,124 @@
+'''
+:Script:       score_cache.py
+
+:Purpose:      Keeps the scores of text pairs that were compared recently, so
+               a pair sent again is answered without scrubbing or scoring it.
+
+Cache Process
+=============
+
+1) Hashes each text to a short digest and hashes the two digests, smallest
+   first, with the digest of the contractions/synonyms table. main gives the
+   same score whichever text comes first, so both orders share one key, and
+   the key changes when the table does
+2) Returns the stored score on a hit as long as it's younger than the time
+   to live, and marks it as recently used
+3) Scores the pair with main, or the scorer given, on a miss and drops
+   expired entries from the least recently used end, then the least recently
+   used entry once the cache holds more than its size limit
+4) Counts hits, misses, expired entries and evictions
+
+The key is known before the pair is scored, so the web layer builds the ETag
+of the result from it and the texts in the order they were given.
+'''
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+class ScoreCache:
+
+    def __init__(self, maxsize=4096, ttl=300, scorer=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.scorer = scorer or evaluator.main
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(first_text, second_text, matcher=None):
+        if matcher is None:
+            matcher = evaluator.contractions_synonyms_matcher
+        digests = sorted(
+            hashlib.blake2b(text.encode("utf-8", "surrogatepass"),
+                            digest_size=16).digest()
+            for text in (first_text, second_text))
+        return hashlib.blake2b(matcher.digest + digests[0] + digests[1],
+                               digest_size=16).digest()
+
+    def score(self, first_text, second_text, scorer=None):
+        return self.lookup(first_text, second_text, scorer)[0]
+
+    def lookup(self, first_text, second_text, scorer=None):
+
+        # Returns (score, key). A scorer given here is used instead of the
+        # cache's own on a miss, e.g. one that reuses a text already scrubbed
+        matcher = evaluator.contractions_synonyms_matcher
+        key = self.key(first_text, second_text, matcher)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0], key
+                del self._entries[key]
+                self.expired += 1
+            self.misses += 1
+
+        # Scores outside of the lock so other threads aren't held up
+        score = (scorer or self.scorer)(first_text, second_text)
+
+        # A score made while another table was swapped in isn't kept
+        if matcher is not evaluator.contractions_synonyms_matcher:
+            return score, key
+        with self._lock:
+            self._entries[key] = (score, now + self.ttl)
+            self._entries.move_to_end(key)
+            self._drop_expired(now)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return score, key
+
+    def _drop_expired(self, now):
+
+        # Stops at the first live entry, expired ones further in are dropped
+        # when they are looked up or evicted
+        while self._entries:
+            key = next(iter(self._entries))
+            if self._entries[key][1] > now:
+                return
+            del self._entries[key]
+            self.expired += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+                }
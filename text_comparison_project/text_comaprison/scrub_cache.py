@@ -0,0 +1,98 @@
+'''
+:Script:       scrub_cache.py
+
+:Purpose:      Keeps the sentence and word lists made by text_scrubber for
+               texts that were seen recently, so repeated texts are only
+               scrubbed once.
+
+Cache Process
+=============
+
+1) Hashes the text to a short digest and uses it as the key, so the text
+   itself is never kept by the cache
+2) Returns the stored sentences on a hit and marks them as recently used
+3) Scrubs the text on a miss and drops the least recently used entry once the
+   cache holds more than its size limit
+4) Counts hits, misses and evictions
+
+Entries are FingerprintedText, holding the sentences as tuples of tuples
+with the fingerprint of each sentence and of the whole text.
+comparison_assessor edits the lists it is given, so callers copy the
+sentences with copy_text_list before scoring them with it. The cache empties
+itself the first time it is used after another contractions/synonyms table
+is swapped in.
+'''
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+class ScrubCache:
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._matcher = evaluator.contractions_synonyms_matcher
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"),
+                               digest_size=16).digest()
+
+    def scrub(self, text):
+        return self.fingerprinted(text).sentences
+
+    def fingerprinted(self, text):
+        key = self.key(text)
+        matcher = evaluator.contractions_synonyms_matcher
+        with self._lock:
+            if matcher is not self._matcher:
+                self._entries.clear()
+                self._matcher = matcher
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Scrubs outside of the lock so other threads aren't held up
+        entry = evaluator.FingerprintedText(
+            evaluator.text_scrubber(text, matcher))
+
+        with self._lock:
+            if matcher is not self._matcher:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+                }
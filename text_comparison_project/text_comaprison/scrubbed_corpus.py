@@ -0,0 +1,227 @@
+'''
+:Script:       scrubbed_corpus.py
+
+:Purpose:      Saves the scrubbed sentences of a whole corpus to a binary file
+               so processes that start up later load them in one read instead
+               of scrubbing every text again.
+
+Script Process
+==============
+
+1) Works out the key of the corpus: a digest of the contractions/synonyms
+   table and of every text, in order
+2) When the file exists and was saved under the same key, reads it whole, or
+   maps it, and returns the corpus from it
+3) Otherwise scrubs every text, interns the words the same way interning.py
+   does and saves the corpus under the key, replacing the old file
+
+Changing a contraction/synonym rule or a text changes the key, so an out of
+date file is never used.
+
+Corpus File
+===========
+
+The header is the 4 bytes b"TSCR", a version byte, 3 padding bytes, the 16
+byte key, then the number of texts, sentences, words (tokens) and distinct
+words as little endian unsigned 64 bit integers. It is followed by, all
+little endian:
+
+- the text offsets into the sentence offsets, texts + 1 unsigned 64 bit
+- the sentence offsets into the tokens, sentences + 1 unsigned 64 bit
+- the word id of every token, signed 32 bit
+- the byte offsets of the distinct words, distinct words + 1 unsigned 64 bit
+- the distinct words in UTF-8, one after another
+
+Commands
+========
+
+$ python -m text_comaprison.scrubbed_corpus texts.txt texts.scrub
+'''
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from text_comaprison import text_similarity_evaluator as evaluator
+from text_comaprison.interning import InternedText, Vocabulary
+
+CORPUS_MAGIC = b"TSCR"
+CORPUS_VERSION = 1
+CORPUS_HEADER = struct.Struct("<4sB3x16sQQQQ")
+
+def corpus_key(texts, matcher=None):
+    if matcher is None:
+        matcher = evaluator.contractions_synonyms_matcher
+    digest = hashlib.blake2b(matcher.digest, digest_size=16)
+    for text in texts:
+        encoded = text.encode("utf-8", "surrogatepass")
+        digest.update(struct.pack("<Q", len(encoded)))
+        digest.update(encoded)
+    return digest.digest()
+
+def _little_endian(values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values.tobytes()
+
+def _array_view(view, typecode):
+
+    # Uses the bytes in place on little endian machines and copies them
+    # everywhere else
+    if sys.byteorder == "little":
+        return view.cast(typecode)
+    values = array(typecode)
+    values.frombytes(view)
+    values.byteswap()
+    return values
+
+class ScrubbedCorpus:
+
+    def __init__(self, key, words, tokens, sentence_offsets, text_offsets):
+        self.key = key
+        self.words = words
+        self.tokens = tokens
+        self.sentence_offsets = sentence_offsets
+        self.text_offsets = text_offsets
+
+    def __len__(self):
+        return len(self.text_offsets) - 1
+
+    def interned(self, index):
+
+        # Returns the text as an InternedText sharing the corpus vocabulary
+        first = self.text_offsets[index]
+        last = self.text_offsets[index + 1]
+        start = self.sentence_offsets[first]
+        offsets = array("i", (self.sentence_offsets[sentence] - start
+                              for sentence in range(first, last + 1)))
+        tokens = array("i", self.tokens[start:self.sentence_offsets[last]])
+        return InternedText(tokens, offsets)
+
+    def text_list(self, index):
+
+        # Returns the sentences as text_scrubber makes them
+        words = self.words
+        text_list = []
+        for sentence in range(self.text_offsets[index],
+                              self.text_offsets[index + 1]):
+            text_list.append([words[word_id] for word_id in self.tokens[
+                self.sentence_offsets[sentence]:
+                self.sentence_offsets[sentence + 1]]])
+        return text_list
+
+    def text_lists(self):
+        return [self.text_list(index) for index in range(len(self))]
+
+def build_scrubbed_corpus(texts, key=None):
+    texts = list(texts)
+    if key is None:
+        key = corpus_key(texts)
+    vocabulary = Vocabulary()
+    tokens = array("i")
+    sentence_offsets = array("Q", [0])
+    text_offsets = array("Q", [0])
+    for text in texts:
+        interned = vocabulary.intern_text(text)
+        start = len(tokens)
+        tokens.extend(interned.tokens)
+        sentence_offsets.extend(start + offset
+                                for offset in interned.offsets[1:])
+        text_offsets.append(len(sentence_offsets) - 1)
+    return ScrubbedCorpus(key, vocabulary.words, tokens, sentence_offsets,
+                          text_offsets)
+
+def write_scrubbed_corpus(path, corpus):
+    encoded_words = [word.encode("utf-8", "surrogatepass")
+                     for word in corpus.words]
+    word_offsets = array("Q", [0])
+    for encoded in encoded_words:
+        word_offsets.append(word_offsets[-1] + len(encoded))
+
+    # Writes a new file and renames it over the old one, so readers never
+    # see half a file
+    temporary_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temporary_path, "wb") as corpus_file:
+        corpus_file.write(CORPUS_HEADER.pack(
+            CORPUS_MAGIC, CORPUS_VERSION, corpus.key, len(corpus),
+            len(corpus.sentence_offsets) - 1, len(corpus.tokens),
+            len(corpus.words)))
+        corpus_file.write(_little_endian(array("Q", corpus.text_offsets)))
+        corpus_file.write(_little_endian(array("Q",
+                                               corpus.sentence_offsets)))
+        corpus_file.write(_little_endian(array("i", corpus.tokens)))
+        corpus_file.write(_little_endian(word_offsets))
+        corpus_file.write(b"".join(encoded_words))
+    os.replace(temporary_path, path)
+
+def read_scrubbed_corpus(path, key=None, use_mmap=False):
+
+    # Returns the corpus saved in the file, or None when it was saved under
+    # another key or by another version
+    with open(path, "rb") as corpus_file:
+        if use_mmap:
+            data = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = corpus_file.read()
+    if len(data) < CORPUS_HEADER.size:
+        return None
+    magic, version, saved_key, text_count, sentence_count, token_count, \
+        word_count = CORPUS_HEADER.unpack_from(data)
+    if magic != CORPUS_MAGIC:
+        raise ValueError("{} is not a scrubbed corpus file".format(path))
+    if version != CORPUS_VERSION or (key is not None and saved_key != key):
+        return None
+
+    view = memoryview(data)
+    position = CORPUS_HEADER.size
+    sections = []
+    for typecode, count in (("Q", text_count + 1),
+                            ("Q", sentence_count + 1),
+                            ("i", token_count),
+                            ("Q", word_count + 1)):
+        size = count * array(typecode).itemsize
+        sections.append(_array_view(view[position:position + size],
+                                    typecode))
+        position += size
+    text_offsets, sentence_offsets, tokens, word_offsets = sections
+
+    word_bytes = view[position:]
+    words = [str(word_bytes[word_offsets[index]:word_offsets[index + 1]],
+                 "utf-8", "surrogatepass") for index in range(word_count)]
+    return ScrubbedCorpus(saved_key, words, tokens, sentence_offsets,
+                          text_offsets)
+
+def load_or_build(path, texts, use_mmap=False):
+
+    # Loads the corpus from the file when it holds these texts scrubbed with
+    # the current rules, otherwise scrubs them and saves them to the file
+    texts = list(texts)
+    key = corpus_key(texts)
+    if os.path.exists(path):
+        corpus = read_scrubbed_corpus(path, key, use_mmap)
+        if corpus is not None:
+            return corpus
+    corpus = build_scrubbed_corpus(texts, key)
+    write_scrubbed_corpus(path, corpus)
+    return corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Saves the scrubbed sentences of a corpus")
+    parser.add_argument("texts", help="file with one text per line")
+    parser.add_argument("output", help="scrubbed corpus file")
+    args = parser.parse_args(argv)
+
+    with open(args.texts, encoding="utf-8") as texts_file:
+        texts = [line.rstrip("\n") for line in texts_file]
+    corpus = load_or_build(args.output, texts)
+    print("{} texts, {} sentences, {} words, {} distinct words".format(
+        len(corpus), len(corpus.sentence_offsets) - 1, len(corpus.tokens),
+        len(corpus.words)))
+
+if __name__ == '__main__':
+    main()
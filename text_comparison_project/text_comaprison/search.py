@@ -0,0 +1,133 @@
+'''
+:Script:       search.py
+
+:Purpose:      Finds the k stored texts most similar to a query. Only the k
+               best results are kept while the corpus is read, and texts that
+               can't beat the k-th best score are skipped before their words
+               are compared.
+
+Script Process
+==============
+
+1) Scrubs the query once
+2) Reads the corpus one text at a time. Raw texts are scrubbed, texts that
+   were scrubbed already are used as they are
+3) Works out the best score the text could get from the lengths of its
+   sentences alone. A sentence pair can match at most as many words as the
+   shorter sentence has, so it adds at most the ratio of the two lengths,
+   and nothing when that ratio isn't above .75
+4) Once k results are kept, skips every text whose best score isn't above the
+   k-th best score, and for the others first asks the early stopping verdict
+   whether they reach the next score up
+5) Scores the texts that are left and swaps them into a heap of the k best
+
+Results are (index, score) pairs, best first; texts with the same score keep
+the order they have in the corpus.
+
+Commands
+========
+
+$ python -m text_comaprison.search texts.txt "text to look for" -k 10
+
+The corpus file holds one text per line. When a mapped_corpus index exists
+for it, the texts are read through the index.
+'''
+
+import argparse
+import heapq
+import os
+import sys
+
+from text_comaprison import text_similarity_evaluator as evaluator
+from text_comaprison.mapped_corpus import MappedCorpus, index_path_for
+
+def best_possible_score(first_text_list, second_text_list):
+
+    # Highest score the texts can get, from the number of words in each
+    # sentence. Padding sentences hold one word.
+    sentence_count = max(len(first_text_list), len(second_text_list))
+    similarity_score = 0
+    for index in range(sentence_count):
+        first_words = len(first_text_list[index]) \
+            if index < len(first_text_list) else 1
+        second_words = len(second_text_list[index]) \
+            if index < len(second_text_list) else 1
+        ratio = min(first_words, second_words)/max(first_words, second_words)
+        if ratio > .75:
+            similarity_score += ratio
+    return round(similarity_score/sentence_count, 2)
+
+def corpus_text_lists(corpus):
+
+    # Yields the scrubbed sentences of every text of a MappedCorpus, or of an
+    # iterable of raw texts and scrubbed texts
+    if isinstance(corpus, MappedCorpus):
+        for index in range(len(corpus)):
+            yield corpus.text_list(index)
+        return
+    for text in corpus:
+        if isinstance(text, str):
+            yield evaluator.text_scrubber(text)
+        else:
+            yield text
+
+def top_k(query, corpus, k, backend="python", stats=None):
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    query_list = evaluator.text_scrubber(query) if isinstance(query, str) \
+        else query
+
+    # Min heap of (score, -index), so the worst kept result is on top and a
+    # later text needs a higher score to replace it
+    heap = []
+    pruned = judged = scored = 0
+
+    for index, text_list in enumerate(corpus_text_lists(corpus)):
+        if len(heap) == k:
+            worst_score = heap[0][0]
+            if best_possible_score(query_list, text_list) <= worst_score:
+                pruned += 1
+                continue
+            judged += 1
+            if not evaluator.compare_scrubbed(query_list, text_list, backend,
+                                              round(worst_score + .01, 2)):
+                continue
+
+        score = evaluator.compare_scrubbed(query_list, text_list, backend)
+        scored += 1
+        if len(heap) < k:
+            heapq.heappush(heap, (score, -index))
+        else:
+            heapq.heapreplace(heap, (score, -index))
+
+    if stats is not None:
+        stats.update(pruned=pruned, judged=judged, scored=scored)
+    return [(-negative_index, score) for score, negative_index in
+            sorted(heap, reverse=True)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Finds the texts most similar to a query")
+    parser.add_argument("corpus", help="file with one text per line")
+    parser.add_argument("query")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--backend", choices=evaluator.ASSESSOR_BACKENDS,
+                        default="python")
+    args = parser.parse_args(argv)
+
+    stats = {}
+    if os.path.exists(index_path_for(args.corpus)):
+        with MappedCorpus(args.corpus) as corpus:
+            results = top_k(args.query, corpus, args.k, args.backend, stats)
+    else:
+        with open(args.corpus, encoding="utf-8") as corpus_file:
+            texts = (line.rstrip("\n") for line in corpus_file)
+            results = top_k(args.query, texts, args.k, args.backend, stats)
+
+    for index, score in results:
+        print("{}\t{:.2f}".format(index, score))
+    print("scored {scored}, judged {judged}, pruned {pruned}".format(**stats),
+          file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+'''
+:Script:       session.py
+
+:Purpose:      Keeps the comparison of a draft against a reference text up to
+               date while the draft is being edited. Only the sentences that
+               changed since the last update are scrubbed and scored again.
+               Every update gives the same score as main(reference, draft).
+
+Script Process
+==============
+
+1) Splits each text on ". " and scrubs every piece on its own, the same way
+   streaming_text_scrubber does, keeping the raw pieces, the scrubbed pieces
+   and their word lists
+2) On an update, finds the pieces at the start and end of the new text that
+   are the same as before and only scrubs the ones in between. The last two
+   sentences are always made again, because text_scrubber strips trailing
+   spaces from the whole text before it is split
+3) Scores again with sentence_assessor only the sentence pairs that changed:
+   the edited pieces and the last sentences, or every pair from the first
+   edit on when the number of sentences changed and the later sentences
+   moved to other positions
+4) Keeps the running totals of the sentence scores, added left to right like
+   alignment_assessor does, and adds them up again only from the first
+   changed sentence on, so the score is the same float main gives
+
+A session notices when another contractions/synonyms table is swapped in and
+scrubs both texts again with it on the next update.
+'''
+
+from itertools import accumulate, chain
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+EMPTY_SENTENCE = [""]
+
+class _ScrubbedText:
+
+    def __init__(self):
+        self.text = None
+        self.pieces = []
+        self.scrubbed = []
+        self.words = []
+        self.tail = []
+        self.tail_start = 0
+
+    def __len__(self):
+        return self.tail_start + len(self.tail)
+
+    def sentence(self, index):
+        if index >= len(self):
+            return EMPTY_SENTENCE
+        if index >= self.tail_start:
+            return self.tail[index - self.tail_start]
+        return self.words[index]
+
+    def _make_tail(self):
+
+        # text_scrubber strips the trailing spaces of the whole text. When
+        # that empties the last piece, the ". " in front of it goes too and
+        # its period stays on the piece before.
+        self.tail_start = max(len(self.scrubbed) - 2, 0)
+        pieces = self.scrubbed[self.tail_start:]
+        last = pieces[-1].rstrip(" ")
+        if len(pieces) == 2 and last == "":
+            self.tail = [evaluator.sentence_splitter(pieces[0] + ".")]
+        elif len(pieces) == 2:
+            self.tail = [self.words[-2], evaluator.sentence_splitter(last)]
+        else:
+            self.tail = [evaluator.sentence_splitter(last)]
+
+    def update(self, text, matcher):
+
+        # Scrubs the pieces that changed and returns the range of them in
+        # the new text
+        old_pieces = self.pieces
+        pieces = text.split(". ")
+
+        limit = min(len(old_pieces), len(pieces))
+        start = 0
+        while start < limit and old_pieces[start] == pieces[start]:
+            start += 1
+
+        # The first piece is scrubbed without a space in front, so it is
+        # never reused at another position
+        same_at_end = 0
+        while same_at_end < limit - max(start, 1) and \
+                old_pieces[-1 - same_at_end] == pieces[-1 - same_at_end]:
+            same_at_end += 1
+        end = len(pieces) - same_at_end
+
+        scrubbed = []
+        for index in range(start, end):
+            if index == 0:
+                scrubbed.append(matcher.replace(pieces[index]))
+            else:
+                scrubbed.append(matcher.replace(" " + pieces[index])[1:])
+        old_end = len(old_pieces) - same_at_end
+        self.scrubbed[start:old_end] = scrubbed
+        self.words[start:old_end] = [evaluator.sentence_splitter(piece)
+                                     for piece in scrubbed]
+        self.pieces = pieces
+        self.text = text
+        self._make_tail()
+        return start, end
+
+class ComparisonSession:
+
+    def __init__(self, reference_text, draft_text=""):
+        self._matcher = evaluator.contractions_synonyms_matcher
+        self._reference = _ScrubbedText()
+        self._draft = _ScrubbedText()
+        self._scores = []
+        self._totals = [0]
+        self.rescored = 0
+        self._reference.update(reference_text, self._matcher)
+        self._draft.update(draft_text, self._matcher)
+        self._rescore(range(self.sentence_count()))
+
+    def sentence_count(self):
+        return max(len(self._reference), len(self._draft))
+
+    @property
+    def score(self):
+        return round(self._totals[-1]/len(self._scores), 2)
+
+    def sentence_scores(self):
+        return list(self._scores)
+
+    def _rescore(self, indices):
+
+        # Scores the sentence pairs at the given indices, in ascending order,
+        # and adds up the totals again from the first of them
+        count = self.sentence_count()
+        del self._scores[count:]
+        del self._totals[count + 1:]
+        self._scores.extend([0] * (count - len(self._scores)))
+        first = count
+        self.rescored = 0
+        for index in indices:
+            if index >= count:
+                break
+            self._scores[index] = evaluator.sentence_assessor(
+                self._reference.sentence(index), self._draft.sentence(index))
+            self.rescored += 1
+            first = min(first, index)
+
+        first = min(first, len(self._totals) - 1)
+        del self._totals[first + 1:]
+        self._totals.extend(accumulate(chain([self._totals[first]],
+                                             self._scores[first:])))
+        del self._totals[first + 1]
+
+    def _update(self, side, text):
+        matcher = evaluator.contractions_synonyms_matcher
+        if matcher is not self._matcher:
+            texts = {self._reference: self._reference.text,
+                     self._draft: self._draft.text, side: text}
+            self.__init__(texts[self._reference], texts[self._draft])
+            return self.score
+
+        old_count = len(side)
+        old_tail_start = side.tail_start
+        start, end = side.update(text, matcher)
+        tail_start = min(old_tail_start, side.tail_start)
+
+        # When the number of sentences changed, every sentence from the
+        # first edit on sits next to another sentence than before
+        if len(side) != old_count:
+            indices = range(min(start, tail_start), self.sentence_count())
+        else:
+            indices = sorted(set(chain(range(start, min(end, tail_start)),
+                                       range(tail_start, len(side)))))
+        self._rescore(indices)
+        return self.score
+
+    def update_draft(self, draft_text):
+        return self._update(self._draft, draft_text)
+
+    def update_reference(self, reference_text):
+        return self._update(self._reference, reference_text)
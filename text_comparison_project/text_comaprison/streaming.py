@@ -0,0 +1,104 @@
+'''
+:Script:       streaming.py
+
+:Purpose:      Compares two very large documents read from file-like objects
+               without keeping either document in memory. Gives the same
+               score as main(first_file.read(), second_file.read()).
+
+Script Process
+==============
+
+1) Reads each file in chunks and splits it on ". " as the chunks come in,
+   keeping only the unfinished sentence between chunks
+2) Scrubs each sentence on its own. Sentences after the first are scrubbed
+   with the space of the ". " in front of them, so rules like " the " still
+   match at the start of a sentence
+3) Holds back the last two sentences of each file until the end of the file
+   is known, because text_scrubber strips trailing spaces from the whole
+   text before splitting it
+4) Scores the sentences pair by pair with sentence_assessor, filling the
+   shorter document with empty sentences, and averages the scores
+
+Memory use is bounded by the longest sentence plus the chunk size. The files
+must be opened in text mode. Scrubbing sentence by sentence relies on no
+contraction/synonym rule matching or producing ". ", which is true of
+contractions_synonyms_dict.
+'''
+
+from itertools import zip_longest
+
+from text_comaprison import text_similarity_evaluator as evaluator
+
+CHUNK_SIZE = 1 << 16
+
+def raw_sentences(text_file, chunk_size=CHUNK_SIZE):
+
+    # Yields the same pieces as text_file.read().split(". ")
+    pending = ""
+    while True:
+        chunk = text_file.read(chunk_size)
+        if not chunk:
+            yield pending
+            return
+
+        # A ". " can start on the last character of the previous chunk, the
+        # rest of the unfinished sentence was already searched.
+        search_from = max(len(pending) - 1, 0)
+        pending += chunk
+        position = pending.find(". ", search_from)
+        start = 0
+        while position != -1:
+            yield pending[start:position]
+            start = position + 2
+            position = pending.find(". ", start)
+        pending = pending[start:]
+
+def streaming_text_scrubber(text_file, chunk_size=CHUNK_SIZE):
+
+    # Yields the same sentences as text_scrubber(text_file.read()), one at a
+    # time.
+    matcher = evaluator.contractions_synonyms_matcher
+    held = []
+
+    for index, sentence in enumerate(raw_sentences(text_file, chunk_size)):
+        if index == 0:
+            held.append(matcher.replace(sentence))
+        else:
+            held.append(matcher.replace(" " + sentence)[1:])
+        if len(held) > 2:
+            yield evaluator.sentence_splitter(held.pop(0))
+
+    yield from end_sentences(held)
+
+def end_sentences(last_pieces):
+
+    # Splits the last one or two scrubbed pieces of a text. The whole text is
+    # stripped of trailing spaces before it is split. When the last sentence
+    # is only spaces, that removes the ". " in front of it too and leaves its
+    # period on the sentence before.
+    last = last_pieces[-1].rstrip(" ")
+    if len(last_pieces) == 2:
+        if last == "":
+            return [evaluator.sentence_splitter(last_pieces[0] + ".")]
+        return [evaluator.sentence_splitter(last_pieces[0]),
+                evaluator.sentence_splitter(last)]
+    return [evaluator.sentence_splitter(last)]
+
+def compare_streams(first_file, second_file, chunk_size=CHUNK_SIZE):
+
+    similarity_score = 0
+    sentence_count = 0
+    empty_sentence = [""]
+
+    first_sentences = streaming_text_scrubber(first_file, chunk_size)
+    second_sentences = streaming_text_scrubber(second_file, chunk_size)
+
+    # The shorter document is padded with empty sentences like text_aligner
+    for first_sentence, second_sentence in zip_longest(
+            first_sentences, second_sentences, fillvalue=empty_sentence):
+        similarity_score += evaluator.sentence_assessor(first_sentence,
+                                                        second_sentence)
+        sentence_count += 1
+
+    score = (round(similarity_score/sentence_count, 2))
+    return(score)
@@ -28,143 +28,381 @@ Script Functions
 ================
 '''
 
-def text_scrubber(text_to_scrub):
-
-    contractions_synonyms_dict = {
-        "ain't": "am not",
-        "aren't": "are not",
-        "can't": "cannot",
-        "can't've": "cannot have",
-        "'cause": "because",
-        "could've": "could have",
-        "couldn't": "could not",
-        "couldn't've": "could not have",
-        "didn't": "did not",
-        "doesn't": "does not",
-        "don't": "do not",
-        "hadn't": "had not",
-        "hadn't've": "had not have",
-        "hasn't": "has not",
-        "haven't": "have not",
-        "he'd": "he would",
-        "he'd've": "he would have",
-        "he'll": "he will",
-        "he'll've": "he will have",
-        "he's": "he is",
-        "how'd": "how did",
-        "how'd'y": "how do you",
-        "how'll": "how will",
-        "how's": "how is",
-        "I'd": "I would",
-        "I'd've": "I would have",
-        "I'll": "I will",
-        "I'll've": "I will have",
-        "I'm": "I am",
-        "I've": "I have",
-        "isn't": "is not",
-        "it'd": "it had",
-        "it'd've": "it would have",
-        "it'll": "it will",
-        "it'll've": "it will have",
-        "it's": "it is",
-        "let's": "let us",
-        "ma'am": "madam",
-        "mayn't": "may not",
-        "might've": "might have",
-        "mightn't": "might not",
-        "mightn't've": "might not have",
-        "must've": "must have",
-        "mustn't": "must not",
-        "mustn't've": "must not have",
-        "needn't": "need not",
-        "needn't've": "need not have",
-        "o'clock": "of the clock",
-        "oughtn't": "ought not",
-        "oughtn't've": "ought not have",
-        "shan't": "shall not",
-        "sha'n't": "shall not",
-        "shan't've": "shall not have",
-        "she'd": "she would",
-        "she'd've": "she would have",
-        "she'll": "she will",
-        "she'll've": "she will have",
-        "she's": "she is",
-        "should've": "should have",
-        "shouldn't": "should not",
-        "shouldn't've": "should not have",
-        "so've": "so have",
-        "so's": "so is",
-        "that'd": "that would",
-        "that'd've": "that would have",
-        "that's": "that is",
-        "there'd": "there had",
-        "there'd've": "there would have",
-        "there's": "there is",
-        "they'd": "they would",
-        "they'd've": "they would have",
-        "they'll": "they will",
-        "they'll've": "they will have",
-        "they're": "they are",
-        "they've": "they have",
-        "to've": "to have",
-        "wasn't": "was not",
-        "we'd": "we had",
-        "we'd've": "we would have",
-        "we'll": "we will",
-        "we'll've": "we will have",
-        "we're": "we are",
-        "we've": "we have",
-        "weren't": "were not",
-        "what'll": "what will",
-        "what'll've": "what will have",
-        "what're": "what are",
-        "what's": "what is",
-        "what've": "what have",
-        "when's": "when is",
-        "when've": "when have",
-        "where'd": "where did",
-        "where's": "where is",
-        "where've": "where have",
-        "who'll": "who will",
-        "who'll've": "who will have",
-        "who's": "who is",
-        "who've": "who have",
-        "why's": "why is",
-        "why've": "why have",
-        "will've": "will have",
-        "won't": "will not",
-        "won't've": "will not have",
-        "would've": "would have",
-        "wouldn't": "would not",
-        "wouldn't've": "would not have",
-        "y'all": "you all",
-        "y'alls": "you alls",
-        "y'all'd": "you all would",
-        "y'all'd've": "you all would have",
-        "y'all're": "you all are",
-        "y'all've": "you all have",
-        "you'd": "you had",
-        "you'd've": "you would have",
-        "you'll": "you will",
-        "you'll've": "you will have",
-        "you're": "you are",
-        "you've": "you have",
-        "UPCs": "barcodes",
-        "cut out": "clip",
-        "participating": "eligible",
-        "check out": "shop",
-        "products": "items",
-        " the ": " ",
-        " a ": " ",
-        " an ": " "
-        }
-    
+import hashlib
+import json
+import re
+import time
+from array import array
+
+contractions_synonyms_dict = {
+    "ain't": "am not",
+    "aren't": "are not",
+    "can't": "cannot",
+    "can't've": "cannot have",
+    "'cause": "because",
+    "could've": "could have",
+    "couldn't": "could not",
+    "couldn't've": "could not have",
+    "didn't": "did not",
+    "doesn't": "does not",
+    "don't": "do not",
+    "hadn't": "had not",
+    "hadn't've": "had not have",
+    "hasn't": "has not",
+    "haven't": "have not",
+    "he'd": "he would",
+    "he'd've": "he would have",
+    "he'll": "he will",
+    "he'll've": "he will have",
+    "he's": "he is",
+    "how'd": "how did",
+    "how'd'y": "how do you",
+    "how'll": "how will",
+    "how's": "how is",
+    "I'd": "I would",
+    "I'd've": "I would have",
+    "I'll": "I will",
+    "I'll've": "I will have",
+    "I'm": "I am",
+    "I've": "I have",
+    "isn't": "is not",
+    "it'd": "it had",
+    "it'd've": "it would have",
+    "it'll": "it will",
+    "it'll've": "it will have",
+    "it's": "it is",
+    "let's": "let us",
+    "ma'am": "madam",
+    "mayn't": "may not",
+    "might've": "might have",
+    "mightn't": "might not",
+    "mightn't've": "might not have",
+    "must've": "must have",
+    "mustn't": "must not",
+    "mustn't've": "must not have",
+    "needn't": "need not",
+    "needn't've": "need not have",
+    "o'clock": "of the clock",
+    "oughtn't": "ought not",
+    "oughtn't've": "ought not have",
+    "shan't": "shall not",
+    "sha'n't": "shall not",
+    "shan't've": "shall not have",
+    "she'd": "she would",
+    "she'd've": "she would have",
+    "she'll": "she will",
+    "she'll've": "she will have",
+    "she's": "she is",
+    "should've": "should have",
+    "shouldn't": "should not",
+    "shouldn't've": "should not have",
+    "so've": "so have",
+    "so's": "so is",
+    "that'd": "that would",
+    "that'd've": "that would have",
+    "that's": "that is",
+    "there'd": "there had",
+    "there'd've": "there would have",
+    "there's": "there is",
+    "they'd": "they would",
+    "they'd've": "they would have",
+    "they'll": "they will",
+    "they'll've": "they will have",
+    "they're": "they are",
+    "they've": "they have",
+    "to've": "to have",
+    "wasn't": "was not",
+    "we'd": "we had",
+    "we'd've": "we would have",
+    "we'll": "we will",
+    "we'll've": "we will have",
+    "we're": "we are",
+    "we've": "we have",
+    "weren't": "were not",
+    "what'll": "what will",
+    "what'll've": "what will have",
+    "what're": "what are",
+    "what's": "what is",
+    "what've": "what have",
+    "when's": "when is",
+    "when've": "when have",
+    "where'd": "where did",
+    "where's": "where is",
+    "where've": "where have",
+    "who'll": "who will",
+    "who'll've": "who will have",
+    "who's": "who is",
+    "who've": "who have",
+    "why's": "why is",
+    "why've": "why have",
+    "will've": "will have",
+    "won't": "will not",
+    "won't've": "will not have",
+    "would've": "would have",
+    "wouldn't": "would not",
+    "wouldn't've": "would not have",
+    "y'all": "you all",
+    "y'alls": "you alls",
+    "y'all'd": "you all would",
+    "y'all'd've": "you all would have",
+    "y'all're": "you all are",
+    "y'all've": "you all have",
+    "you'd": "you had",
+    "you'd've": "you would have",
+    "you'll": "you will",
+    "you'll've": "you will have",
+    "you're": "you are",
+    "you've": "you have",
+    "UPCs": "barcodes",
+    "cut out": "clip",
+    "participating": "eligible",
+    "check out": "shop",
+    "products": "items",
+    " the ": " ",
+    " a ": " ",
+    " an ": " "
+}
+
+def _replace_in_order(text, table):
+
+    # Applies every entry of the table to the whole text one after another,
+    # so an entry can rewrite the output of any entry before it.
+    for key, value in table.items():
+        if key in text:
+            text = text.replace(key, value)
+    return text
+
+def _trie_pattern(keys):
+
+    # Folds the keys into a trie so the regex checks one branch per character
+    # instead of trying every key at every position of the text.
+    trie = {}
+    for key in keys:
+        node = trie
+        for character in key:
+            node = node.setdefault(character, {})
+        node[""] = {}
+
+    def node_pattern(node):
+        branches = [re.escape(character) + node_pattern(child)
+                    for character, child in sorted(node.items()) if character]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else \
+            "(?:" + "|".join(branches) + ")"
+
+        # Longer keys are tried first, a key ending here is the fallback
+        if "" in node:
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return node_pattern(trie)
+
+def _in_word(character):
+    return character.isalnum() or character == "'" or character == "_"
+
+def _junction_indexes(keys):
+
+    # Indexes the keys by the pieces that can meet text left around them at
+    # a character outside of a word: the starts of keys that go on with such
+    # a character, their ends that follow one, and every piece of a key that
+    # has one on either side. The other pieces could only meet the text
+    # inside a word, which the pass never lets a match touch.
+    starts, ends, holders = {}, {}, {}
+    for index, key in enumerate(keys):
+        for position, character in enumerate(key):
+            if _in_word(character):
+                continue
+            if position:
+                starts.setdefault(key[:position], []).append(index)
+            if position < len(key) - 1:
+                ends.setdefault(key[position + 1:], []).append(index)
+            for start in range(position):
+                holders.setdefault(key[start:position], []).append(index)
+            for end in range(position + 2, len(key) + 1):
+                holders.setdefault(key[position + 1:end], []).append(index)
+    return starts, ends, holders
+
+def _key_trie(keys):
+    trie = {}
+    for index, key in enumerate(keys):
+        node = trie
+        for character in key:
+            node = node.setdefault(character, {})
+        node[""] = index
+    return trie
+
+def _next_entry(text, trie, first):
+
+    # Returns the index of the earliest entry from first on whose key is in
+    # the text, or None
+    found = None
+    for start in range(len(text)):
+        node = trie
+        for position in range(start, len(text)):
+            node = node.get(text[position])
+            if node is None:
+                break
+            index = node.get("")
+            if index is not None and index >= first and \
+                    (found is None or index < found):
+                found = index
+    return found
+
+def _forms(key, keys, table, trie):
+
+    # Yields (form, first entry, last entry) for every form the key takes
+    # when the table is applied to it in order, with the entries applied
+    # while it has that form. The first form is the key itself.
+    text = key
+    first = 0
+    while True:
+        index = _next_entry(text, trie, first)
+        if index is None:
+            yield text, first, len(keys) - 1
+            return
+        yield text, first, index
+        text = text.replace(keys[index], table[keys[index]])
+        first = index + 1
+
+def _single_pass_length(keys, table, trie):
+
+    # Returns how many entries from the start of the table can be replaced in
+    # one pass, given that every match stands between characters outside of
+    # a word. That fails at a key starting or ending outside of a word, once a
+    # key can run on from the end of a match into the text after it, or once
+    # a later entry can take in part of the text next to what a match became
+    # and some of it, or all of it when it's empty. The entries from there on
+    # keep their order.
+    starts, ends, holders = _junction_indexes(keys)
+    longest = max(map(len, keys))
+    split = len(keys)
+    for index, key in enumerate(keys):
+        if not _in_word(key[0]) or not _in_word(key[-1]):
+            split = min(split, index)
+        for form, first, last in _forms(key, keys, table, trie):
+            if first > split:
+                break
+            made = first > 0
+            found = []
+            if made and not form:
+                found.append(first)
+            for size in range(1, min(len(form), longest) + 1):
+                if made or size < len(form):
+                    found.extend(starts.get(form[-size:], ()))
+                if made:
+                    found.extend(ends.get(form[:size], ()))
+            if made:
+                found.extend(holders.get(form, ()))
+            for other in found:
+                if first <= other <= last:
+                    split = min(split, max(index, other, first - 1))
+    return split
+
+class ContractionsSynonymsMatcher:
+    '''
+    Compiled form of a contractions/synonyms table. The entries at the start
+    of the table are rewritten in a single left to right regex pass, each key
+    replaced by what the whole table turns it into (so "can't've" becomes
+    "cannot've" because "can't" comes first). The first entry whose key starts
+    or ends outside of a word, like " the ", or that could make the pass give
+    other text than applying the entries one by one, like "buy now" after
+    "purchase" -> "buy", and every entry after it are still applied in order
+    with str.replace.
+
+    The pass is checked for a table where every match stands on its own,
+    with a space, punctuation or the end of the text on both sides. A text
+    where a match starts or ends inside a word, like "check out" in "check
+    outlet", or runs into the next match, is rewritten entry by entry
+    instead, so every text comes out as if the table had been applied in
+    order.
+    '''
+
+    def __init__(self, table):
+        self.table = dict(table)
+
+        # Identifies the table, order included, for anything stored with it
+        self.digest = hashlib.blake2b(
+            json.dumps(list(self.table.items())).encode("utf-8"),
+            digest_size=16).digest()
+
+        keys = [key for key in self.table if key]
+        self.all_rules = [(key, self.table[key]) for key in keys]
+        self.replacements = {}
+        self.pattern = None
+        if keys:
+            trie = _key_trie(keys)
+            split = _single_pass_length(keys, self.table, trie)
+
+            # Each key is replaced by the form it has once the entries
+            # before the split ran over it
+            for key in keys[:split]:
+                for form, first, _ in _forms(key, keys, self.table, trie):
+                    if first > split:
+                        break
+                    self.replacements[key] = form
+            if self.replacements:
+                self.pattern = re.compile(_trie_pattern(self.replacements))
+        self.ordered_rules = self.all_rules[len(self.replacements):]
+
+    def replace(self, text):
+        if self.pattern is not None:
+
+            # Every key starts and ends inside a word, so a match running
+            # into the next one has a word character after it as well
+            pieces = []
+            end = 0
+            for match in self.pattern.finditer(text):
+                start = match.start()
+                if start and _in_word(text[start - 1]):
+                    return self._replace_in_order(text, self.all_rules)
+                pieces.append(text[end:start])
+                end = match.end()
+                if end < len(text) and _in_word(text[end]):
+                    return self._replace_in_order(text, self.all_rules)
+                pieces.append(self.replacements[match.group()])
+            if pieces:
+                pieces.append(text[end:])
+                text = "".join(pieces)
+        return self._replace_in_order(text, self.ordered_rules)
+
+    @staticmethod
+    def _replace_in_order(text, rules):
+        for key, value in rules:
+            if key in text:
+                text = text.replace(key, value)
+        return text
+
+    def stats(self):
+        return {
+            "entries": len(self.table),
+            "single_pass_keys": len(self.replacements),
+            "ordered_rules": len(self.ordered_rules),
+            "pattern_characters": len(self.pattern.pattern)
+                                  if self.pattern is not None else 0
+            }
+
+contractions_synonyms_matcher = \
+    ContractionsSynonymsMatcher(contractions_synonyms_dict)
+
+def use_contractions_synonyms(matcher):
+
+    # Swaps in another compiled table for every scrub that starts after this.
+    # Rebinding the name is atomic, so scrubs already running finish with the
+    # matcher they started with.
+    global contractions_synonyms_matcher
+    contractions_synonyms_matcher = matcher
+
+def text_scrubber(text_to_scrub, matcher=None):
 
     # Replaces contractions or sysonyms with predefiend values
-    for key, value in contractions_synonyms_dict.items():
-        if key in text_to_scrub:
-            text_to_scrub = text_to_scrub.replace(key, value)
+    if matcher is None:
+        matcher = contractions_synonyms_matcher
+    return text_splitter(matcher.replace(text_to_scrub))
+
+def text_splitter(text_to_scrub):
 
+    # Splits a text whose contractions and synonyms were already replaced
     text_to_scrub = text_to_scrub.rstrip(" ")
     text_in_list = text_to_scrub.split(". ")
     texts_in_list = []
@@ -172,13 +410,47 @@ def text_scrubber(text_to_scrub):
     # Adds each sentence to its own lists and adds the the lists of sentences in
     # to a larger list.
     for sentence in text_in_list:
-        if not sentence.endswith("."):
-            sentence = sentence + "."
-        sentence = sentence.split(" ")
-        texts_in_list.append(sentence)
+        texts_in_list.append(sentence_splitter(sentence))
 
     return texts_in_list
 
+def sentence_splitter(sentence):
+
+    # Makes sure the sentence ends with a period and splits it into words
+    if not sentence.endswith("."):
+        sentence = sentence + "."
+    return sentence.split(" ")
+
+def copy_text_list(text_list):
+
+    # Copies each sentence so the copy can be edited by comparison_assessor
+    # without changing the original lists.
+    return [list(sentence) for sentence in text_list]
+
+def scrubbed_text_list(text, cache=None):
+
+    # Scrubs the text, or takes its sentences from the cache when one is given.
+    # Cached sentences are shared, so they are copied before being returned.
+    if cache is None:
+        return text_scrubber(text)
+    return copy_text_list(cache.scrub(text))
+
+def text_aligner(first_text_list, second_text_list):
+
+    # Making sure the first text has the most sentences, then pads the second
+    # text with empty sentences until both have the same number of sentences.
+    if len(first_text_list) < len(second_text_list):
+            len_first_text = first_text_list
+            len_second_text = second_text_list
+            first_text_list = len_second_text
+            second_text_list = len_first_text
+
+    while len(first_text_list) > len(second_text_list):
+        empty_list = [""]
+        second_text_list.append(empty_list)
+
+    return first_text_list, second_text_list
+
 def comparison_assessor(first_text_list, second_text_list):
 
     i = 0
@@ -245,7 +517,358 @@ def comparison_assessor(first_text_list, second_text_list):
     #print("Text similarity score = " + str(score))
     return(score)
         
-def main(first_text, second_text):
+def _misses_allowed(length):
+
+    # Returns the most words of a sentence of this length that can miss while
+    # the sentence still scores above .75, worked out with the same division
+    # sentence_assessor uses.
+    misses = length - int(length * .75) - 1
+    while misses >= 0 and not (length - misses)/length > .75:
+        misses -= 1
+    while (length - misses - 1)/length > .75:
+        misses += 1
+    return misses
+
+def _matched_words(first_sentence, second_sentence, compatible,
+                   misses_allowed):
+
+    # Counts the words of the longer first sentence that match the shorter
+    # second one. Instead of inserting "" into the shorter sentence, it keeps
+    # count of the inserts and reads the shorter sentence that many words
+    # back, so the sentences are never changed and each word is looked at
+    # once. Returns None as soon as more than misses_allowed words missed.
+    inserts_needed = len(first_sentence) - len(second_sentence)
+    inserts = 0
+    score_minder = 0
+
+    for count, first_text_word in enumerate(first_sentence):
+        second_count = count - inserts
+
+        # The reference loop fails with an IndexError when the shorter
+        # sentence runs out while inserts are still due.
+        if second_count >= len(second_sentence):
+            if compatible:
+                raise IndexError("list index out of range")
+        elif first_text_word == second_sentence[second_count]:
+            score_minder +=1
+            continue
+
+        # Stands in for the "" the reference loop would insert here
+        if inserts < inserts_needed:
+            inserts += 1
+
+        # Both sentences are the same length now, so checks to see if the
+        # word in the next position matches.
+        elif count + 1 < len(first_sentence):
+            if first_text_word == second_sentence[second_count + 1] or \
+                first_sentence[count + 1] == second_sentence[second_count]:
+                    score_minder +=1
+
+        if count + 1 - score_minder > misses_allowed:
+            return None
+
+    return score_minder
+
+def sentence_assessor(first_sentence, second_sentence, compatible=False):
+
+    # Scores a single pair of sentences and returns what the pair adds to the
+    # similarity score
+    if len(first_sentence) < len(second_sentence):
+        first_sentence, second_sentence = second_sentence, first_sentence
+    if not first_sentence:
+        return 0
+
+    # Every word of the same sentence matches, which makes the score 1.0.
+    # The reference loop can move on early within a sentence whose last word
+    # repeats, so the compatible engine always reads the words.
+    if not compatible and first_sentence == second_sentence:
+        return 1.0
+
+    # Once more words have missed than the 0.75 cutoff allows, the sentence
+    # adds nothing whatever the rest of it holds. The compatible engine reads
+    # on to the end, where the reference loop may still fail.
+    misses_allowed = len(first_sentence) if compatible else \
+        _misses_allowed(len(first_sentence))
+    score_minder = _matched_words(first_sentence, second_sentence, compatible,
+                                  misses_allowed)
+
+    if score_minder is not None and score_minder/len(first_sentence) > .75:
+        return score_minder/len(first_sentence)
+    return 0
+
+def sentence_ratio(first_sentence, second_sentence):
+
+    # Returns the share of the words of the longer sentence that match,
+    # whether or not it passes the .75 cutoff
+    if len(first_sentence) < len(second_sentence):
+        first_sentence, second_sentence = second_sentence, first_sentence
+    if not first_sentence:
+        return 0
+    return _matched_words(first_sentence, second_sentence, False,
+                          len(first_sentence))/len(first_sentence)
+
+def _repeats_last_word(first_text_list, second_text_list):
+
+    # comparison_assessor moves on to the next sentence as soon as it sees the
+    # last word of the longer sentence, even when that word comes earlier in
+    # the sentence as well.
+    for first_sentence, second_sentence in zip(first_text_list,
+                                               second_text_list):
+        if len(first_sentence) < len(second_sentence):
+            first_sentence = second_sentence
+        if first_sentence and first_sentence[-1] in first_sentence[:-1]:
+            return True
+    return False
+
+def alignment_assessor(first_text_list, second_text_list, compatible=False):
+
+    # Scores aligned texts sentence by sentence with sentence_assessor, in
+    # linear time and without changing the lists. With compatible set, the
+    # score is the same as comparison_assessor gives in every case, including
+    # the ones where it moves to the next sentence early or fails.
+    if compatible and _repeats_last_word(first_text_list, second_text_list):
+        return comparison_assessor(copy_text_list(first_text_list),
+                                   copy_text_list(second_text_list))
+    if not compatible and first_text_list == second_text_list:
+        return 1.0
+
+    similarity_score = 0
+    for first_sentence, second_sentence in zip(first_text_list,
+                                               second_text_list):
+        similarity_score += sentence_assessor(first_sentence, second_sentence,
+                                              compatible)
+
+    score = (round(similarity_score/len(first_text_list), 2))
+    return(score)
+
+def sentence_fingerprint(sentence):
+
+    # Digest of a scrubbed sentence. Words never hold a space, so joining
+    # them with spaces keeps different sentences apart.
+    return hashlib.blake2b(" ".join(sentence).encode("utf-8", "surrogatepass"),
+                           digest_size=8).digest()
+
+class FingerprintedText:
+    '''
+    Scrubbed sentences of a text together with the fingerprint of each
+    sentence and of the whole text, so equal sentences and equal texts can be
+    found without comparing their words. Instances are kept by ScrubCache and
+    can be compared again and again.
+    '''
+
+    __slots__ = ("sentences", "sentence_fingerprints", "fingerprint")
+
+    def __init__(self, text_list):
+        self.sentences = tuple(tuple(sentence) for sentence in text_list)
+        self.sentence_fingerprints = tuple(map(sentence_fingerprint,
+                                               self.sentences))
+        self.fingerprint = hashlib.blake2b(
+            b"".join(self.sentence_fingerprints), digest_size=16).digest()
+
+    def __len__(self):
+        return len(self.sentences)
+
+PADDING_FINGERPRINT = sentence_fingerprint([""])
+
+def fingerprint_assessor(first_text, second_text):
+
+    # Gives the same score as alignment_assessor for two FingerprintedText.
+    # Equal texts score 1.0 straight away and equal sentences add 1.0
+    # without their words being compared.
+    if first_text.fingerprint == second_text.fingerprint:
+        return 1.0
+    if len(first_text) < len(second_text):
+        first_text, second_text = second_text, first_text
+
+    similarity_score = 0
+    second_count = len(second_text)
+    for index, first_sentence in enumerate(first_text.sentences):
+        if index < second_count:
+            second_sentence = second_text.sentences[index]
+            second_fingerprint = second_text.sentence_fingerprints[index]
+        else:
+            second_sentence = [""]
+            second_fingerprint = PADDING_FINGERPRINT
+        if first_text.sentence_fingerprints[index] == second_fingerprint:
+            similarity_score += 1.0
+        else:
+            similarity_score += sentence_assessor(first_sentence,
+                                                  second_sentence)
+
+    score = (round(similarity_score/len(first_text), 2))
+    return(score)
+
+def compatible_assessor(first_text_list, second_text_list):
+    return alignment_assessor(first_text_list, second_text_list, True)
+
+def threshold_assessor(first_text_list, second_text_list, threshold):
+
+    # Decides whether alignment_assessor scores the aligned texts at or above
+    # the threshold. Every sentence adds between 0 and 1 to the similarity
+    # score, so it stops as soon as the sentences left can no longer lift the
+    # score to the threshold or the score already reaches it. The slack on
+    # the best case covers the rounding of the float sums.
+    sentence_count = len(first_text_list)
+    sentence_pairs = zip(first_text_list, second_text_list)
+    remaining = sentence_count
+    similarity_score = 0
+
+    while True:
+        if round(similarity_score/sentence_count, 2) >= threshold:
+            return True
+        if not remaining:
+            return False
+        best_score = similarity_score + remaining * (1 + 1e-9)
+        if round(best_score/sentence_count, 2) < threshold:
+            return False
+
+        first_sentence, second_sentence = next(sentence_pairs)
+        similarity_score += sentence_assessor(first_sentence, second_sentence)
+        remaining -= 1
+
+ASSESSOR_BACKENDS = ("python", "compatible", "reference", "numpy")
+
+def assessor_backend(backend):
+
+    # Returns the function used to score the sentences. "python" is the linear
+    # alignment engine, "compatible" the same engine giving the scores of the
+    # original loop in every case and "reference" the original loop itself.
+    # The numpy backend is only imported when it is asked for, so numpy stays
+    # optional.
+    if backend == "python":
+        return alignment_assessor
+    if backend == "compatible":
+        return compatible_assessor
+    if backend == "reference":
+        return comparison_assessor
+    if backend == "numpy":
+        from text_comaprison.vectorized_assessor import \
+            vectorized_comparison_assessor
+        return vectorized_comparison_assessor
+    raise ValueError("Unknown backend: {}".format(backend))
+
+def decision_backend(backend):
+
+    # Returns the function giving the match verdict for aligned texts and a
+    # threshold. Only the linear engine stops early, the other backends score
+    # the whole text and compare the score.
+    if backend == "python":
+        return threshold_assessor
+    assessor = assessor_backend(backend)
+
+    def decide(first_text_list, second_text_list, threshold):
+        return assessor(first_text_list, second_text_list) >= threshold
+
+    return decide
+
+class ComparisonReport:
+    '''
+    What main(..., profile=True) returns: the score, the seconds spent in
+    each phase, the number of sentences and words of each text and, for
+    every aligned sentence pair, the share of matching words and whether it
+    passed the .75 cutoff. The sentence ratios are kept in an array of
+    doubles and the cutoff results in a bytearray, so a report for a long
+    text stays small.
+    '''
+
+    __slots__ = ("score", "matched", "backend", "scrub_seconds",
+                 "split_seconds", "padding_seconds", "assess_seconds",
+                 "first_sentences", "second_sentences", "first_words",
+                 "second_words", "sentence_ratios", "sentence_passed")
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.score = None
+        self.matched = None
+        self.scrub_seconds = 0.0
+        self.split_seconds = 0.0
+        self.padding_seconds = 0.0
+        self.assess_seconds = 0.0
+        self.first_sentences = 0
+        self.second_sentences = 0
+        self.first_words = 0
+        self.second_words = 0
+        self.sentence_ratios = array("d")
+        self.sentence_passed = bytearray()
+
+    @property
+    def total_seconds(self):
+        return self.scrub_seconds + self.split_seconds + \
+            self.padding_seconds + self.assess_seconds
+
+    def sentences(self):
+
+        # Yields (index, ratio, passed) for every aligned sentence pair
+        for index, ratio in enumerate(self.sentence_ratios):
+            yield index, ratio, bool(self.sentence_passed[index])
+
+    def as_dict(self):
+        report = {name: getattr(self, name) for name in self.__slots__
+                  if not name.startswith("sentence_")}
+        report["total_seconds"] = self.total_seconds
+        report["sentences"] = [{"ratio": ratio, "passed": passed}
+                               for _, ratio, passed in self.sentences()]
+        return report
+
+    def __repr__(self):
+        return ("<ComparisonReport score={} sentences={} total={:.3f}ms>"
+                .format(self.score, len(self.sentence_ratios),
+                        self.total_seconds * 1000))
+
+def profiled_main(first_text, second_text, backend="python", threshold=None):
+
+    # Runs the same steps as main, timing each one, and fills a
+    # ComparisonReport. The cache isn't used, so the scrub is always timed.
+    # The per sentence breakdown comes from the linear engine and isn't part
+    # of the timings.
+    report = ComparisonReport(backend)
+    matcher = contractions_synonyms_matcher
+
+    start = time.perf_counter()
+    first_scrubbed = matcher.replace(first_text)
+    second_scrubbed = matcher.replace(second_text)
+    split = time.perf_counter()
+    first_text_list = text_splitter(first_scrubbed)
+    second_text_list = text_splitter(second_scrubbed)
+    padding = time.perf_counter()
+
+    report.first_sentences = len(first_text_list)
+    report.second_sentences = len(second_text_list)
+    report.first_words = sum(map(len, first_text_list))
+    report.second_words = sum(map(len, second_text_list))
+
+    first_text_list, second_text_list = \
+        text_aligner(first_text_list, second_text_list)
+    assess = time.perf_counter()
+
+    # The reference loop edits the lists, so it is given copies made before
+    # the clock starts
+    assessor = assessor_backend(backend)
+    if backend == "reference":
+        first_copy = copy_text_list(first_text_list)
+        second_copy = copy_text_list(second_text_list)
+        assess = time.perf_counter()
+        report.score = assessor(first_copy, second_copy)
+    else:
+        report.score = assessor(first_text_list, second_text_list)
+    end = time.perf_counter()
+
+    report.scrub_seconds = split - start
+    report.split_seconds = padding - split
+    report.padding_seconds = assess - padding
+    report.assess_seconds = end - assess
+    if threshold is not None:
+        report.matched = report.score >= threshold
+
+    for first_sentence, second_sentence in zip(first_text_list,
+                                               second_text_list):
+        ratio = sentence_ratio(first_sentence, second_sentence)
+        report.sentence_ratios.append(ratio)
+        report.sentence_passed.append(ratio > .75)
+    return report
+
+def main(first_text, second_text, cache=None, backend="python",
+         threshold=None, profile=False):
 
     #first_text = str(input("Enter the first text to compare: "))
     #second_text = str(input("Enter the first text to compare: "))
@@ -253,18 +876,88 @@ def main(first_text, second_text):
     #first_text = "The easiest way to earn points with Fetch Rewards is to just shop for the products you already love. If you have any participating brands on your receipt, you'll get points based on the cost of the products. You don't need to clip any coupons or scan individual barcodes. Just scan each grocery receipt after you shop and we'll find the savings for you."
     #second_text = "The easiest way to earn points with Fetch Rewards is to just shop for the items you already buy. If you have any eligible brands on your receipt, you will get points based on the total cost of the products. You do not need to cut out any coupons or scan individual UPCs. Just scan your receipt after you check out and we will find the savings for you."
 
-    first_text_list = text_scrubber(first_text)
-    second_text_list = text_scrubber(second_text)
+    # With profile set, returns a ComparisonReport instead of the score
+    if profile:
+        return profiled_main(first_text, second_text, backend, threshold)
 
-    if len(first_text_list) < len(second_text_list):
-            len_first_text = first_text_list
-            len_second_text = second_text_list
-            first_text_list = len_second_text
-            second_text_list = len_first_text
+    # The same text always scores 1.0 with the linear engine, and cached
+    # texts are scored from their fingerprints.
+    if backend == "python" and threshold is None:
+        if first_text == second_text:
+            return 1.0
+        if cache is not None:
+            return fingerprint_assessor(cache.fingerprinted(first_text),
+                                        cache.fingerprinted(second_text))
 
-    while len(first_text_list) > len(second_text_list):
-        empty_list = [""]
-        second_text_list.append(empty_list)
+    first_text_list = scrubbed_text_list(first_text, cache)
+    second_text_list = scrubbed_text_list(second_text, cache)
+    return assess_scrubbed(first_text_list, second_text_list, backend,
+                           threshold)
+
+def assess_scrubbed(first_text_list, second_text_list, backend="python",
+                    threshold=None):
 
-    similarity_score = comparison_assessor(first_text_list, second_text_list)
+    # The second step of main: aligns two scrubbed texts and scores them.
+    # The lists are edited, compare_scrubbed copies them first.
+    first_text_list, second_text_list = \
+        text_aligner(first_text_list, second_text_list)
+
+    # With a threshold, returns whether the texts match instead of the score
+    if threshold is not None:
+        decide = decision_backend(backend)
+        return decide(first_text_list, second_text_list, threshold)
+
+    assessor = assessor_backend(backend)
+    similarity_score = assessor(first_text_list, second_text_list)
     return(similarity_score)
+
+def compare_many(query, candidates, cache=None, backend="python",
+                 threshold=None):
+
+    # Scrubs the query once and scores it against every candidate. Candidates
+    # can be raw strings or lists of sentences already returned by
+    # text_scrubber. Each score matches main(query, candidate), and with a
+    # threshold each result is the match verdict instead.
+    if cache is not None and backend == "python" and threshold is None:
+        query_text = cache.fingerprinted(query)
+        return [fingerprint_assessor(
+            query_text, cache.fingerprinted(candidate)
+            if isinstance(candidate, str) else FingerprintedText(candidate))
+            for candidate in candidates]
+
+    if cache is None:
+        query_list = text_scrubber(query)
+    else:
+        query_list = cache.scrub(query)
+    if threshold is None:
+        assessor = assessor_backend(backend)
+    else:
+        decide = decision_backend(backend)
+
+        def assessor(first_text_list, second_text_list):
+            return decide(first_text_list, second_text_list, threshold)
+
+    scores = []
+
+    for candidate in candidates:
+        if isinstance(candidate, str):
+            candidate_list = scrubbed_text_list(candidate, cache)
+        else:
+            candidate_list = copy_text_list(candidate)
+
+        # comparison_assessor edits the lists it is given, so the query is
+        # copied for every candidate.
+        first_text_list, second_text_list = \
+            text_aligner(copy_text_list(query_list), candidate_list)
+        scores.append(assessor(first_text_list, second_text_list))
+
+    return(scores)
+
+def compare_scrubbed(first_text_list, second_text_list, backend="python",
+                     threshold=None):
+
+    # Scores two texts that were already scrubbed. Both are copied first, so
+    # the lists passed in are left as they are.
+    return assess_scrubbed(copy_text_list(first_text_list),
+                           copy_text_list(second_text_list), backend,
+                           threshold)
@@ -0,0 +1,171 @@
+'''
+:Script:       vectorized_assessor.py
+
+:Purpose:      NumPy version of comparison_assessor. Scores every sentence of
+               two aligned texts with array operations and returns the same
+               rounded score as the reference loop.
+
+Script Process
+==============
+
+1) Maps every word to an integer id and stores the sentences of both texts
+   in padded matrices, one row per sentence, with the longer sentence of each
+   pair in the first matrix
+2) Replays the empty string inserts of the reference loop. While the second
+   sentence is shorter, words are compared on a diagonal that moves one step
+   to the right at every mismatch, so each insert is one search for the first
+   mismatch on a diagonal for all rows at once
+3) Compares the rest of each sentence at the same position and at the count
+   +/-1 neighbours in one pass over the matrices
+4) Keeps the sentences matching more than 75% and averages them over the
+   number of sentences
+
+Pairs the reference loop handles in an irregular way (a sentence repeating its
+last word, an empty sentence, or a shorter sentence that runs out of words)
+are handed to the compatible alignment engine so the result is always the
+same.
+'''
+
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from text_comaprison.text_similarity_evaluator import compatible_assessor
+
+FIRST_PAD = -1
+SECOND_PAD = -2
+
+class _ReferenceFallback(Exception):
+    pass
+
+def _padded_matrix(sentences, lengths, width, vocabulary, pad):
+
+    # Looks up every word in one pass and scatters the ids into their rows
+    words = list(chain.from_iterable(sentences))
+    ids = np.fromiter(map(vocabulary.__getitem__, words), dtype=np.int64,
+                      count=len(words))
+    rows = np.repeat(np.arange(len(sentences)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    columns = np.arange(len(words)) - np.repeat(starts, lengths)
+    matrix = np.full((len(sentences), width), pad, dtype=np.int64)
+    matrix[rows, columns] = ids
+    return matrix
+
+def _sentence_matrices(first_text_list, second_text_list):
+
+    first_sentences = []
+    second_sentences = []
+
+    # Making sure the first sentence is the longer one, as the reference does
+    for first_sentence, second_sentence in zip(first_text_list,
+                                               second_text_list):
+        if len(first_sentence) < len(second_sentence):
+            first_sentence, second_sentence = second_sentence, first_sentence
+        if not first_sentence or first_sentence[-1] in first_sentence[:-1]:
+            raise _ReferenceFallback()
+        first_sentences.append(first_sentence)
+        second_sentences.append(second_sentence)
+
+    words = set(chain.from_iterable(first_sentences))
+    words.update(chain.from_iterable(second_sentences))
+    vocabulary = dict(zip(words, range(len(words))))
+
+    first_lengths = np.fromiter(map(len, first_sentences), dtype=np.int64,
+                                count=len(first_sentences))
+    second_lengths = np.fromiter(map(len, second_sentences), dtype=np.int64,
+                                 count=len(second_sentences))
+
+    # One extra column so the count+1 neighbour of the last word is padding
+    width = int(first_lengths.max()) + 1
+    first_matrix = _padded_matrix(first_sentences, first_lengths, width,
+                                  vocabulary, FIRST_PAD)
+    second_matrix = _padded_matrix(second_sentences, second_lengths, width,
+                                   vocabulary, SECOND_PAD)
+
+    return first_matrix, second_matrix, first_lengths, second_lengths
+
+def _shifted(matrix, shifts):
+
+    # Moves every row of the matrix right by its shift, filling with padding
+    columns = np.arange(matrix.shape[1]) - shifts[:, None]
+    rows = np.arange(matrix.shape[0])[:, None]
+    shifted = matrix[rows, np.clip(columns, 0, None)]
+    shifted[columns < 0] = SECOND_PAD
+    return shifted
+
+def _score_minders(first_matrix, second_matrix, first_lengths,
+                   second_lengths):
+
+    rows, width = first_matrix.shape
+    columns = np.arange(width)
+    inserts_needed = first_lengths - second_lengths
+    position = np.zeros(rows, dtype=np.int64)
+    score_minder = np.zeros(rows, dtype=np.int64)
+
+    # A one word sentence (such as the [""] padding) whose word is not in the
+    # other sentence scores nothing, so it skips the walk below.
+    unmatched = (second_lengths == 1) & \
+        ~np.any(first_matrix == second_matrix[:, :1], axis=1)
+    position[unmatched] = first_lengths[unmatched]
+
+    # Insert phase: on diagonal s the word at count is compared with word
+    # count - s of the second sentence. A mismatch inserts "" and moves the
+    # row to diagonal s + 1 on the next word.
+    for diagonal in range(int(inserts_needed.max())):
+        active = np.flatnonzero((inserts_needed > diagonal) &
+                                (position < first_lengths))
+        if not active.size:
+            break
+        mismatch = first_matrix[active, diagonal:] != \
+            second_matrix[active, :width - diagonal]
+        mismatch &= columns[diagonal:] >= position[active, None]
+        mismatch &= columns[diagonal:] < first_lengths[active, None]
+        first_mismatch = np.where(mismatch.any(axis=1),
+                                  mismatch.argmax(axis=1) + diagonal,
+                                  first_lengths[active])
+
+        # A mismatch against padding means the reference indexes past the
+        # end of the second sentence
+        if np.any(first_mismatch - diagonal >= second_lengths[active]):
+            raise _ReferenceFallback()
+
+        score_minder[active] += first_mismatch - position[active]
+        position[active] = first_mismatch + 1
+
+    # Both sentences have the same length from here on, so each word counts
+    # if it matches at the same position or at either count+1 neighbour.
+    current = _shifted(second_matrix, inserts_needed)
+    same = first_matrix[:, :-1] == current[:, :-1]
+    following = first_matrix[:, :-1] == current[:, 1:]
+    preceding = first_matrix[:, 1:] == current[:, :-1]
+    counted = same | following | preceding
+    counted &= columns[:-1] >= position[:, None]
+    counted &= columns[:-1] < first_lengths[:, None]
+    score_minder += counted.sum(axis=1)
+
+    return score_minder
+
+def vectorized_comparison_assessor(first_text_list, second_text_list):
+
+    if np is None:
+        raise RuntimeError("The numpy backend needs numpy to be installed")
+
+    try:
+        first_matrix, second_matrix, first_lengths, second_lengths = \
+            _sentence_matrices(first_text_list, second_text_list)
+        score_minder = _score_minders(first_matrix, second_matrix,
+                                      first_lengths, second_lengths)
+    except _ReferenceFallback:
+        return compatible_assessor(first_text_list, second_text_list)
+
+    # Adds up the passing sentences from left to right like the reference
+    # loop so the rounded score comes out the same.
+    ratios = score_minder / first_lengths
+    passed = np.where(ratios > .75, ratios, 0.0)
+    similarity_score = float(np.cumsum(passed)[-1])
+
+    score = (round(similarity_score/len(first_text_list), 2))
+    return(score)